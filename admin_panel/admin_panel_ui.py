@@ -5,6 +5,8 @@ from __future__ import annotations
 import html
 import textwrap
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
 from typing import Callable, Dict, List, Optional
 
 _CHAT_TYPE_LABELS = {
@@ -14,29 +16,96 @@ _CHAT_TYPE_LABELS = {
     "channel": "📣 Канал",
 }
 
+_BYTE_UNITS = ("B", "KB", "MB", "GB", "TB")
 
+# Платформы, которые пишет сам бот: их подписи заранее известны и не требуют экранирования.
+_PLATFORM_LABELS = {
+    name: name.upper() for name in ("youtube", "tiktok", "instagram", "unknown", "")
+}
+
+# Шаблоны строк таблиц разбираются один раз; значения подставляются уже экранированными.
+_TOP_ROW_TPL = (
+    "<tr><td>{rank}</td><td>{name}</td><td>{downloads}</td><td>{size}</td><td>{failed}</td>"
+    "<td><div class=\"quota-chip\" title=\"{plan_title}\">"
+    "{plan_label} · {daily_used}/{daily_quota}</div></td></tr>"
+)
+_PLATFORM_ROW_TPL = (
+    "<tr><td>{platform}</td><td>{downloads}</td><td>{size}</td><td>{failed}</td></tr>"
+)
+_RECENT_ROW_TPL = (
+    "<tr><td>{name}</td><td>{platform}</td><td>{status}</td><td>{size}</td>"
+    "<td>{timestamp}</td></tr>"
+)
+_CHAT_ROW_TPL = (
+    "<tr class=\"{row_class}\"><td><a href=\"{link}\">{title}</a></td><td>{chat_id}</td>"
+    "<td>{chat_type}</td><td>{downloads}</td><td>{failed}</td><td>{users}</td><td>{size}</td>"
+    "<td>{last_activity}</td></tr>"
+)
+_EMPTY_CHAT_ROW = "<tr><td colspan=\"7\">Нет чатов</td></tr>"
+_ACTIVE_QUEUE_ROW_TPL = (
+    "<tr><td>{user_id}</td><td>{active}</td><td class=\"{since_class}\">{since}</td>"
+    "<td><button class=\"action-btn danger\" data-action=\"cancel_user\" "
+    "data-user-id=\"{user_id}\" "
+    "data-confirm=\"Сбросить активные загрузки пользователя {user_id}?\">Сбросить</button>"
+    "</td></tr>"
+)
+_PENDING_QUEUE_ROW_TPL = (
+    "<tr><td><code>{token}</code></td><td>{initiator}</td><td>{source_chat}</td>"
+    "<td>{age}</td><td><button class=\"action-btn danger\" data-action=\"drop_token\" "
+    "data-token=\"{token}\" data-confirm=\"Удалить pending кнопку?\">Удалить</button>"
+    "</td></tr>"
+)
+_FAILURE_ROW_TPL = (
+    "<tr><td>{name}</td><td>{platform}</td><td class=\"error\">{error}</td>"
+    "<td>{timestamp}</td><td><span class=\"status-pill danger\">{status}</span></td></tr>"
+)
+_LOG_ITEM_TPL = (
+    "<li><span class=\"log-ts\">{timestamp}</span><span class=\"log-level\">{level}</span>"
+    "<span class=\"log-msg\">{message}</span></li>"
+)
+_ALERT_ROW_TPL = (
+    "<tr><td><span class=\"status-pill {severity_class}\">{severity}</span></td>"
+    "<td><span class=\"status-pill {status_class}\">{status}</span></td>"
+    "<td><code>{code}</code></td>"
+    "<td class=\"alert-message\">{message}<br><small class=\"muted\">{details}</small></td>"
+    "<td>{created}</td><td>{last_notified}</td><td>{resolved}</td></tr>"
+)
+
+
+# Форматтеры вызываются по несколько раз на строку, а значения (нули, одинаковые
+# даты активности) сильно повторяются, поэтому результаты кэшируются.
+@lru_cache(maxsize=64)
 def format_chat_type_label(chat_type: Optional[str]) -> str:
     if not chat_type:
         return "—"
     return _CHAT_TYPE_LABELS.get(chat_type.lower(), "—")
 
 
+def format_platform_label(platform: object) -> str:
+    label = _PLATFORM_LABELS.get(platform) if isinstance(platform, str) else None
+    if label is not None:
+        return label
+    return html.escape(str(platform).upper())
+
+
+@lru_cache(maxsize=4096)
 def format_bytes(value: int) -> str:
-    units = ["B", "KB", "MB", "GB", "TB"]
-    size = float(value)
-    for unit in units:
-        if size < 1024 or unit == units[-1]:
-            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
-        size /= 1024
-    return f"{value} B"
+    size = int(value)
+    if size < 1024:
+        return f"{size} B"
+    # Единица выбирается сразу по числу бит, без цикла последовательных делений.
+    exponent = min((size.bit_length() - 1) // 10, len(_BYTE_UNITS) - 1)
+    return f"{size / (1 << (10 * exponent)):.1f} {_BYTE_UNITS[exponent]}"
 
 
+@lru_cache(maxsize=1024)
 def format_ratio(part: int, total: int) -> str:
     if total <= 0:
         return "0%"
     return f"{(part / total) * 100:.1f}%"
 
 
+@lru_cache(maxsize=1024)
 def format_duration(value: Optional[int]) -> str:
     if not value:
         return "—"
@@ -54,6 +123,7 @@ def format_duration(value: Optional[int]) -> str:
     return " ".join(parts)
 
 
+@lru_cache(maxsize=4096)
 def format_timestamp(ts: Optional[object]) -> str:
     if not ts:
         return "—"
@@ -100,34 +170,6 @@ def render_identity_badge(
     )
 
 
-def render_summary_cards(
-    *, total_downloads: int, successful: int, failed: int, total_bytes: int, unique_users: int
-) -> str:
-    return f"""
-    <div class="cards">
-        <article class="card">
-            <p class="label">Всего загрузок</p>
-            <p class="value">{total_downloads:,}</p>
-        </article>
-        <article class="card">
-            <p class="label">Успешных</p>
-            <p class="value">{successful:,}</p>
-            <p class="hint">{format_ratio(successful, total_downloads)}</p>
-        </article>
-        <article class="card">
-            <p class="label">Ошибок</p>
-            <p class="value">{failed:,}</p>
-            <p class="hint">{format_ratio(failed, total_downloads)}</p>
-        </article>
-        <article class="card">
-            <p class="label">Данные</p>
-            <p class="value">{format_bytes(int(total_bytes))}</p>
-            <p class="hint">Пользователей: {unique_users}</p>
-        </article>
-    </div>
-    """
-
-
 def render_queue_section(runtime_state: Dict[str, object]) -> str:
     semaphore_state: Dict[str, object] = runtime_state.get("semaphore") or {}
     runtime_active_total = int(runtime_state.get("active_total", 0) or 0)
@@ -144,31 +186,26 @@ def render_queue_section(runtime_state: Dict[str, object]) -> str:
             utilization_pct = 0
 
     active_queue_rows = "".join(
-        f"""
-        <tr>
-            <td>{row.get('user_id')}</td>
-            <td>{row.get('active')}</td>
-            <td class=\"{'danger-text' if row.get('is_stuck') else ''}\">{format_since(row.get('seconds_since_last'))}</td>
-            <td>
-                <button class=\"action-btn danger\" data-action=\"cancel_user\" data-user-id=\"{row.get('user_id')}\" data-confirm=\"Сбросить активные загрузки пользователя {row.get('user_id')}?\">Сбросить</button>
-            </td>
-        </tr>
-        """
+        _ACTIVE_QUEUE_ROW_TPL.format_map(
+            {
+                "user_id": row.get("user_id"),
+                "active": row.get("active"),
+                "since_class": "danger-text" if row.get("is_stuck") else "",
+                "since": format_since(row.get("seconds_since_last")),
+            }
+        )
         for row in active_rows
     ) or "<tr><td colspan=\"4\">Нет активных загрузок</td></tr>"
 
     pending_queue_rows = "".join(
-        f"""
-        <tr>
-            <td><code>{html.escape(str(row.get('token')))}</code></td>
-            <td>{row.get('initiator_id') or '—'}</td>
-            <td>{row.get('source_chat_id') or '—'}</td>
-            <td>{format_since(row.get('age_seconds'))}</td>
-            <td>
-                <button class=\"action-btn danger\" data-action=\"drop_token\" data-token=\"{html.escape(str(row.get('token')))}\" data-confirm=\"Удалить pending кнопку?\">Удалить</button>
-            </td>
-        </tr>
-        """
+        _PENDING_QUEUE_ROW_TPL.format_map(
+            {
+                "token": html.escape(str(row.get("token"))),
+                "initiator": row.get("initiator_id") or "—",
+                "source_chat": row.get("source_chat_id") or "—",
+                "age": format_since(row.get("age_seconds")),
+            }
+        )
         for row in pending_rows
     ) or "<tr><td colspan=\"5\">Pending кнопок нет</td></tr>"
 
@@ -249,17 +286,15 @@ def render_queue_section(runtime_state: Dict[str, object]) -> str:
 
 def render_failures_section(failures: List[Dict[str, object]]) -> str:
     failure_rows = "".join(
-        f"""
-        <tr>
-            <td>{html.escape(str(item.get('username') or item.get('user_id')))}</td>
-            <td>{html.escape(str(item.get('platform', 'unknown')).upper())}</td>
-            <td class=\"error\">{html.escape(str(item.get('error_message') or '—'))}</td>
-            <td>{format_timestamp(item.get('timestamp'))}</td>
-            <td>
-                <span class=\"status-pill danger\">{html.escape(str(item.get('status')))}</span>
-            </td>
-        </tr>
-        """
+        _FAILURE_ROW_TPL.format_map(
+            {
+                "name": html.escape(str(item.get("username") or item.get("user_id"))),
+                "platform": format_platform_label(item.get("platform", "unknown")),
+                "error": html.escape(str(item.get("error_message") or "—")),
+                "timestamp": format_timestamp(item.get("timestamp")),
+                "status": html.escape(str(item.get("status"))),
+            }
+        )
         for item in failures
     ) or "<tr><td colspan=\"5\">Ошибок нет</td></tr>"
 
@@ -286,53 +321,75 @@ def render_failures_section(failures: List[Dict[str, object]]) -> str:
 
 def render_top_rows(top_users: List[Dict[str, object]]) -> str:
     return "".join(
-        f"""
-        <tr>
-            <td>{idx + 1}</td>
-            <td>{html.escape(str(user.get('username') or user.get('user_id')))}</td>
-            <td>{user.get('total_downloads', 0)}</td>
-            <td>{format_bytes(int(user.get('total_bytes', 0) or 0))}</td>
-            <td>{user.get('failed_count', 0)}</td>
-            <td>
-                <div class="quota-chip" title="{html.escape(str(user.get('plan_label', '')))}">
-                    {html.escape(str(user.get('plan_label', '—')))} · {user.get('daily_used', 0)}/{user.get('effective_daily_quota', 0)}
-                </div>
-            </td>
-        </tr>
-        """
+        _TOP_ROW_TPL.format_map(
+            {
+                "rank": idx + 1,
+                "name": html.escape(str(user.get("username") or user.get("user_id"))),
+                "downloads": user.get("total_downloads", 0),
+                "size": format_bytes(int(user.get("total_bytes", 0) or 0)),
+                "failed": user.get("failed_count", 0),
+                "plan_title": html.escape(str(user.get("plan_label", ""))),
+                "plan_label": html.escape(str(user.get("plan_label", "—"))),
+                "daily_used": user.get("daily_used", 0),
+                "daily_quota": user.get("effective_daily_quota", 0),
+            }
+        )
         for idx, user in enumerate(top_users)
     ) or "<tr><td colspan=\"6\">Нет данных</td></tr>"
 
 
 def render_platform_rows(platforms: List[Dict[str, object]]) -> str:
     return "".join(
-        f"""
-        <tr>
-            <td>{html.escape(str(item.get('platform', 'unknown')).upper())}</td>
-            <td>{item.get('download_count', 0)}</td>
-            <td>{format_bytes(int(item.get('total_bytes', 0) or 0))}</td>
-            <td>{item.get('failed_count', 0)}</td>
-        </tr>
-        """
+        _PLATFORM_ROW_TPL.format_map(
+            {
+                "platform": format_platform_label(item.get("platform", "unknown")),
+                "downloads": item.get("download_count", 0),
+                "size": format_bytes(int(item.get("total_bytes", 0) or 0)),
+                "failed": item.get("failed_count", 0),
+            }
+        )
         for item in platforms
     ) or "<tr><td colspan=\"4\">Нет данных</td></tr>"
 
 
 def render_recent_rows(recent: List[Dict[str, object]]) -> str:
     return "".join(
-        f"""
-        <tr>
-            <td>{html.escape(str(item.get('username') or item.get('user_id')))}</td>
-            <td>{html.escape(str(item.get('platform', 'unknown')).upper())}</td>
-            <td>{item.get('status')}</td>
-            <td>{format_bytes(int(item.get('file_size_bytes') or 0))}</td>
-            <td>{format_timestamp(item.get('timestamp'))}</td>
-        </tr>
-        """
+        _RECENT_ROW_TPL.format_map(
+            {
+                "name": html.escape(str(item.get("username") or item.get("user_id"))),
+                "platform": format_platform_label(item.get("platform", "unknown")),
+                "status": item.get("status"),
+                "size": format_bytes(int(item.get("file_size_bytes") or 0)),
+                "timestamp": format_timestamp(item.get("timestamp")),
+            }
+        )
         for item in recent
     ) or "<tr><td colspan=\"5\">История пуста</td></tr>"
 
 
+def _render_chat_row(
+    chat: Dict[str, object], chat_link: Callable[[Optional[object]], str], row_class: str
+) -> str:
+    cid = chat.get("chat_id")
+    title = (str(chat.get("title") or "").strip()) or f"Чат #{cid}"
+    if title.lower().startswith("chat #"):
+        title = title.replace("Chat #", "Чат #", 1)
+    return _CHAT_ROW_TPL.format_map(
+        {
+            "row_class": row_class,
+            "link": chat_link(cid),
+            "title": html.escape(str(title)),
+            "chat_id": cid,
+            "chat_type": format_chat_type_label(chat.get("chat_type")),
+            "downloads": chat.get("total_downloads", 0),
+            "failed": chat.get("failed_downloads", 0),
+            "users": chat.get("unique_users", 0),
+            "size": format_bytes(int(chat.get("total_bytes", 0) or 0)),
+            "last_activity": format_timestamp(chat.get("last_activity")),
+        }
+    )
+
+
 def render_chat_table(
     *,
     chat_id: Optional[int],
@@ -342,57 +399,43 @@ def render_chat_table(
     unique_users: int,
     total_bytes: int,
     last_activity: Optional[object],
-    build_link: Callable[[Dict[str, Optional[str]]], str],
+    chat_link: Callable[[Optional[object]], str],
 ) -> str:
-    rows: List[str] = []
-    global_link = build_link({"chat_id": None})
-    rows.append(
-        f"""
-        <tr class=\"{'active' if chat_id is None else ''}\">
-            <td><a href=\"{global_link}\">🌐 Вся история</a></td>
-            <td>—</td>
-            <td>—</td>
-            <td>{total_downloads:,}</td>
-            <td>{failed:,}</td>
-            <td>{unique_users}</td>
-            <td>{format_bytes(int(total_bytes))}</td>
-            <td>{format_timestamp(last_activity)}</td>
-        </tr>
-        """
+    global_row = _CHAT_ROW_TPL.format_map(
+        {
+            "row_class": "active" if chat_id is None else "",
+            "link": chat_link(None),
+            "title": "🌐 Вся история",
+            "chat_id": "—",
+            "chat_type": "—",
+            "downloads": f"{total_downloads:,}",
+            "failed": f"{failed:,}",
+            "users": unique_users,
+            "size": format_bytes(int(total_bytes)),
+            "last_activity": format_timestamp(last_activity),
+        }
     )
-    for chat in chat_list:
-        cid = chat.get("chat_id")
-        title = (str(chat.get("title") or "").strip()) or f"Чат #{cid}"
-        if title.lower().startswith("chat #"):
-            title = title.replace("Chat #", "Чат #", 1)
-        row_link = build_link({"chat_id": cid})
-        chat_type_label = format_chat_type_label(chat.get("chat_type"))
-        rows.append(
-            f"""
-            <tr class=\"{'active' if cid == chat_id else ''}\">
-                <td><a href=\"{row_link}\">{html.escape(str(title))}</a></td>
-                <td>{cid}</td>
-                <td>{chat_type_label}</td>
-                <td>{chat.get('total_downloads', 0)}</td>
-                <td>{chat.get('failed_downloads', 0)}</td>
-                <td>{chat.get('unique_users', 0)}</td>
-                <td>{format_bytes(int(chat.get('total_bytes', 0) or 0))}</td>
-                <td>{format_timestamp(chat.get('last_activity'))}</td>
-            </tr>
-            """
+    # Область выбирается один раз: в глобальном режиме ни одна строка чата не
+    # активна, и сравнивать chat_id в каждой строке не нужно.
+    if chat_id is None:
+        chat_rows = (_render_chat_row(chat, chat_link, "") for chat in chat_list)
+    else:
+        chat_rows = (
+            _render_chat_row(chat, chat_link, "active" if chat.get("chat_id") == chat_id else "")
+            for chat in chat_list
         )
-    return "".join(rows) or "<tr><td colspan=\"7\">Нет чатов</td></tr>"
+    return "".join(chain((global_row,), chat_rows)) or _EMPTY_CHAT_ROW
 
 
 def render_logs_list(error_logs: List[Dict[str, str]]) -> str:
     return "".join(
-        f"""
-        <li>
-            <span class=\"log-ts\">{html.escape(log.get('timestamp', ''))}</span>
-            <span class=\"log-level\">{html.escape(log.get('level', 'ERROR'))}</span>
-            <span class=\"log-msg\">{html.escape(log.get('message', ''))}</span>
-        </li>
-        """
+        _LOG_ITEM_TPL.format_map(
+            {
+                "timestamp": html.escape(log.get("timestamp", "")),
+                "level": html.escape(log.get("level", "ERROR")),
+                "message": html.escape(log.get("message", "")),
+            }
+        )
         for log in error_logs
     ) or "<li class=\"muted\">Последние ошибки не найдены</li>"
 
@@ -503,50 +546,44 @@ def render_health_section(
     )
 
 
+def _render_alert_row(alert: Dict[str, object]) -> str:
+    severity = str(alert.get("severity", "warning")).lower()
+    severity_class = "danger" if severity == "danger" else ("warning" if severity.startswith("warn") else "")
+    status = str(alert.get("status", "open"))
+    status_class = "danger" if status == "open" and severity_class == "danger" else ("warning" if status == "open" else "")
+    detail_payload = alert.get("details")
+    if isinstance(detail_payload, dict):
+        details_text = ", ".join(f"{html.escape(str(k))}={html.escape(str(v))}" for k, v in detail_payload.items())
+    elif detail_payload:
+        details_text = html.escape(str(detail_payload))
+    else:
+        details_text = "—"
+    return _ALERT_ROW_TPL.format_map(
+        {
+            "severity_class": severity_class,
+            "severity": html.escape(severity.upper()),
+            "status_class": status_class,
+            "status": html.escape(status),
+            "code": html.escape(str(alert.get("code", "unknown"))),
+            "message": html.escape(str(alert.get("message", ""))),
+            "details": details_text,
+            "created": html.escape(format_timestamp(alert.get("created_at"))),
+            "last_notified": html.escape(format_timestamp(alert.get("last_notified_at"))),
+            "resolved": html.escape(format_timestamp(alert.get("resolved_at"))),
+        }
+    )
+
+
 def render_alerts_section(alerts: List[Dict[str, object]]) -> str:
     if not alerts:
         return "<p class=\"muted\">Актуальных алертов нет.</p>"
 
-    rows = []
-    for alert in alerts:
-        severity = str(alert.get("severity", "warning")).lower()
-        severity_class = "danger" if severity == "danger" else ("warning" if severity.startswith("warn") else "")
-        status = str(alert.get("status", "open"))
-        status_class = "danger" if status == "open" and severity_class == "danger" else ("warning" if status == "open" else "")
-        code = html.escape(str(alert.get("code", "unknown")))
-        message = html.escape(str(alert.get("message", "")))
-        severity_label = html.escape(severity.upper())
-        status_label = html.escape(status)
-        created = html.escape(format_timestamp(alert.get("created_at")))
-        resolved = html.escape(format_timestamp(alert.get("resolved_at")))
-        last_notified = html.escape(format_timestamp(alert.get("last_notified_at")))
-        detail_payload = alert.get("details")
-        if isinstance(detail_payload, dict):
-            details_text = ", ".join(f"{html.escape(str(k))}={html.escape(str(v))}" for k, v in detail_payload.items())
-        elif detail_payload:
-            details_text = html.escape(str(detail_payload))
-        else:
-            details_text = "—"
-        rows.append(
-            f"""
-            <tr>
-                <td><span class=\"status-pill {severity_class}\">{severity_label}</span></td>
-                <td><span class=\"status-pill {status_class}\">{status_label}</span></td>
-                <td><code>{code}</code></td>
-                <td class=\"alert-message\">{message}<br><small class=\"muted\">{details_text}</small></td>
-                <td>{created}</td>
-                <td>{last_notified}</td>
-                <td>{resolved}</td>
-            </tr>
-            """
-        )
-
     return (
         "<table class=\"alerts-table\">"
         "<thead><tr>"
         "<th>Severity</th><th>Status</th><th>Code</th><th>Message</th><th>Created</th><th>Notified</th><th>Resolved</th>"
         "</tr></thead>"
-        f"<tbody>{''.join(rows)}</tbody></table>"
+        f"<tbody>{''.join(map(_render_alert_row, alerts))}</tbody></table>"
     )
 
 
@@ -604,6 +641,7 @@ def render_dashboard_js() -> str:
 
 __all__ = [
     "format_chat_type_label",
+    "format_platform_label",
     "format_bytes",
     "format_ratio",
     "format_duration",
@@ -611,7 +649,6 @@ __all__ = [
     "format_since",
     "render_select_options",
     "render_identity_badge",
-    "render_summary_cards",
     "render_queue_section",
     "render_failures_section",
     "render_top_rows",
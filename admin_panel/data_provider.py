@@ -2,8 +2,11 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import logging
-from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import config
 from monitoring import get_health_snapshot
@@ -29,7 +32,7 @@ class DashboardDataProvider:
         self._log_reader = log_reader
         self._logger = logger or logging.getLogger(__name__)
 
-    def collect_dashboard(
+    async def collect_dashboard(
         self,
         *,
         chat_id: Optional[int],
@@ -38,32 +41,42 @@ class DashboardDataProvider:
         platform_sort: str,
         search_query: Optional[str],
         log_tail: int,
+        executor: Optional[Executor] = None,
     ) -> Dict[str, Any]:
-        summary = stats_service.get_summary(chat_id)
-        top_users = stats_service.get_top_users(chat_id, limit=10, order_by=top_sort)
+        loop = asyncio.get_running_loop()
+
+        def run(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Awaitable[Any]:
+            return loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+        # Выборки независимы и идут через пул соединений, поэтому выполняются
+        # параллельно: задержка дашборда равна самой долгой из них, а не сумме.
+        # Чтение лога тоже уходит в пул, чтобы файловый ввод-вывод не держал цикл.
+        (
+            summary,
+            top_users,
+            platforms,
+            recent,
+            failures,
+            chat_list,
+            health_data,
+            alerts,
+            runtime_state,
+            error_logs,
+        ) = await asyncio.gather(
+            run(stats_service.get_summary, chat_id),
+            run(stats_service.get_top_users, chat_id, limit=10, order_by=top_sort),
+            run(stats_service.get_platform_stats, chat_id, order_by=platform_sort),
+            run(stats_service.get_recent_downloads, chat_id, limit=10),
+            run(stats_service.get_recent_failures, chat_id, limit=10),
+            run(stats_service.list_chats, order_by=chat_sort, search=search_query, limit=100),
+            run(self._health_snapshot),
+            run(self._recent_alerts),
+            run(self._runtime.snapshot),
+            run(self._log_reader, log_tail),
+        )
         top_users = self._with_plan_metadata(top_users)
-        platforms = stats_service.get_platform_stats(chat_id, order_by=platform_sort)
-        recent = stats_service.get_recent_downloads(chat_id, limit=10)
-        failures = stats_service.get_recent_failures(chat_id, limit=10)
-        chat_list = stats_service.list_chats(order_by=chat_sort, search=search_query, limit=100)
         scope = "Глобальная статистика" if chat_id is None else f"Чат #{chat_id}"
 
-        health_data: Optional[Dict[str, Any]] = None
-        if getattr(config, "HEALTHCHECK_ENABLED", False):
-            try:
-                health_data = get_health_snapshot()
-            except Exception:  # pragma: no cover - defensive logging only
-                self._logger.debug("Не удалось получить health snapshot", exc_info=True)
-
-        alerts: List[Dict[str, Any]] = []
-        if config.ENABLE_HISTORY:
-            try:
-                alerts = alert_service.recent_alerts(limit=25)
-            except Exception:
-                self._logger.debug("Не удалось получить health alerts", exc_info=True)
-
-        runtime_state = self._runtime.snapshot()
-
         return {
             "summary": summary,
             "top_users": top_users,
@@ -77,12 +90,30 @@ class DashboardDataProvider:
             "top_sort": top_sort,
             "platform_sort": platform_sort,
             "search_query": search_query or "",
-            "error_logs": self._log_reader(log_tail),
+            "error_logs": error_logs,
             "health": health_data,
             "runtime": runtime_state,
             "alerts": alerts,
         }
 
+    def _health_snapshot(self) -> Optional[Dict[str, Any]]:
+        if not getattr(config, "HEALTHCHECK_ENABLED", False):
+            return None
+        try:
+            return get_health_snapshot()
+        except Exception:  # pragma: no cover - defensive logging only
+            self._logger.debug("Не удалось получить health snapshot", exc_info=True)
+            return None
+
+    def _recent_alerts(self) -> List[Dict[str, Any]]:
+        if not config.ENABLE_HISTORY:
+            return []
+        try:
+            return alert_service.recent_alerts(limit=25)
+        except Exception:
+            self._logger.debug("Не удалось получить health alerts", exc_info=True)
+            return []
+
     def _with_plan_metadata(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         plans = config.SUBSCRIPTION_PLANS or {}
         fallback_key = config.DEFAULT_SUBSCRIPTION_PLAN
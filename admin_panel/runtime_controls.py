@@ -55,6 +55,14 @@ class RuntimeController:
     def _call_on_bot_loop(self, func, *args, **kwargs):
         if not self._bot_loop:
             return func(*args, **kwargs)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._bot_loop:
+            # Панель работает на цикле бота: ждать future здесь значило бы заблокировать
+            # тот самый цикл, который должен его выполнить.
+            return func(*args, **kwargs)
         future: Future = Future()
 
         def runner():
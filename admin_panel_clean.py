@@ -4,9 +4,13 @@ This is a replacement for the broken `admin_panel.py`. It provides the
 same functions but lives in a new module to avoid import-time issues while
 we stabilize the original file.
 """
+import asyncio
 import html
 import logging
-from typing import Optional
+import operator
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from aiogram import types
 
@@ -98,62 +102,26 @@ async def is_admin(message: types.Message) -> bool:
         return False
 
 
-async def cmd_stats(message: types.Message):
-    chat_id, is_group, chat_title = _resolve_scope(message)
-    stats = stats_service.get_summary(chat_id)
+_SEPARATOR = "------------------------"
 
-    if (stats or {}).get('total_downloads', 0) == 0:
-        await message.reply('📊 В этом чате ещё не было загрузок.')
-        return
 
-    title = (
-        f"Статистика по группе ({chat_title})" if is_group else "Статистика вашего диалога с ботом"
-    )
+def _mb(total_bytes: Optional[int], digits: int = 2) -> str:
+    return _escape_html(str(round((total_bytes or 0) / (1024 * 1024), digits)))
 
-    if not stats:
-        await message.reply('📊 Статистика недоступна или БД пуста.')
-        return
 
-    total_bytes = stats.get('total_bytes', 0)
-    total_mb = round(total_bytes / (1024 * 1024), 2)
-    
-    # Экранируем числовые значения (точки в числах)
-    total_downloads = _escape_html(str(stats.get('total_downloads', 0)))
-    successful = _escape_html(str(stats.get('successful_downloads', 0)))
-    failed_count = _escape_html(str(stats.get('failed_downloads', 0)))
-    total_mb_escaped = _escape_html(str(total_mb))
-    unique_users = _escape_html(str(stats.get('unique_users', 0)))
+async def _summary_lines(message: types.Message, chat_id: int, stats: dict) -> List[str]:
+    return [
+        f"• Всего загрузок: <b>{_escape_html(str(stats.get('total_downloads', 0)))}</b>",
+        f"• Успешных: <b>{_escape_html(str(stats.get('successful_downloads', 0)))}</b>",
+        f"• Ошибок: <b>{_escape_html(str(stats.get('failed_downloads', 0)))}</b>",
+        _SEPARATOR,
+        f"📈 Объём данных: <b>{_mb(stats.get('total_bytes', 0))} MB</b>",
+        f"👥 Уникальных пользователей: <b>{_escape_html(str(stats.get('unique_users', 0)))}</b>",
+    ]
 
-    text = (
-        f"📊 <b>{title}</b>\n"
-        "------------------------\n"
-        f"• Всего загрузок: <b>{total_downloads}</b>\n"
-        f"• Успешных: <b>{successful}</b>\n"
-        f"• Ошибок: <b>{failed_count}</b>\n"
-        "------------------------\n"
-        f"📈 Объём данных: <b>{total_mb_escaped} MB</b>\n"
-        f"👥 Уникальных пользователей: <b>{unique_users}</b>"
-    )
-    await message.reply(text, parse_mode='HTML')
-
-
-async def cmd_top_users(message: types.Message):
-    chat_id, is_group, chat_title = _resolve_scope(message)
-    users = stats_service.get_top_users(chat_id, limit=10)
 
-    if not users:
-        await message.reply('👥 В этом чате ещё не было загрузок.')
-        return
-
-    if is_group:
-        header = (
-            f"👥 <b>Активность участников ({chat_title})</b>\n"
-            "------------------------"
-        )
-    else:
-        header = '👥 <b>Ваша активность в этом диалоге</b>\n------------------------'
-
-    lines = [header]
+async def _top_user_lines(message: types.Message, chat_id: int, users: List[dict]) -> List[str]:
+    lines: List[str] = []
     for i, user in enumerate(users, 1):
         username = user.get('username')
         first = user.get('first_name') if 'first_name' in user else None
@@ -164,57 +132,158 @@ async def cmd_top_users(message: types.Message):
             first = first or fetched_first
             last = last or fetched_last
         display = _display_user_name(username, first, last, user.get('user_id'))
-        
-        # Экранируем числовые значения
         downloads = _escape_html(str(user.get('total_downloads', 0)))
-        total_bytes = user.get('total_bytes', 0)
-        total_mb = _escape_html(str(round(total_bytes / (1024 * 1024), 2)))
         failed = _escape_html(str(user.get('failed_count', 0)))
 
         lines.append(f"<b>{i}. {display}</b>")
         lines.append(f"   • Загрузок: <b>{downloads}</b> (ошибок: <b>{failed}</b>)")
-        lines.append(f"   • Данные: <b>{total_mb} MB</b>\n")
-
-    text = '\n'.join(lines)
-    await message.reply(text, parse_mode='HTML')
-
+        lines.append(f"   • Данные: <b>{_mb(user.get('total_bytes', 0))} MB</b>\n")
+    return lines
 
-async def cmd_platform_stats(message: types.Message):
-    chat_id, is_group, chat_title = _resolve_scope(message)
-    platforms = stats_service.get_platform_stats(chat_id)
 
-    if not platforms:
-        await message.reply('🌐 В этом чате ещё нет загрузок по платформам.')
-        return
-
-    if is_group:
-        header = (
-            f"🌐 <b>Платформы в чате ({chat_title})</b>\n"
-            "------------------------"
-        )
-    else:
-        header = '🌐 <b>Платформы в вашем диалоге</b>\n------------------------'
-
-    lines = [header]
+async def _platform_lines(message: types.Message, chat_id: int, platforms: List[dict]) -> List[str]:
+    lines: List[str] = []
     for p in platforms:
         name = _escape_html((p.get('platform') or 'unknown').upper())
         count = _escape_html(str(p.get('download_count', 0)))
-        total_bytes = p.get('total_bytes', 0)
-        total_mb = _escape_html(str(round(total_bytes / (1024 * 1024), 2)))
         failed = _escape_html(str(p.get('failed_count', 0)))
 
         lines.append(f"<b>{name}</b>")
         lines.append(f"   • Загрузок: <b>{count}</b> (ошибок: <b>{failed}</b>)")
-        lines.append(f"   • Данные: <b>{total_mb} MB</b>\n")
+        lines.append(f"   • Данные: <b>{_mb(p.get('total_bytes', 0))} MB</b>\n")
+    return lines
 
-    text = '\n'.join(lines)
-    await message.reply(text, parse_mode='HTML')
+
+async def _recent_lines(message: types.Message, chat_id: int, downloads: List[dict]) -> List[str]:
+    lines: List[str] = []
+    for dl in downloads:
+        uname = dl.get('username')
+        first = dl.get('first_name') if 'first_name' in dl else None
+        last = dl.get('last_name') if 'last_name' in dl else None
+        display = _display_user_name(uname, first, last, dl.get('user_id'))
+        platform = _escape_html((dl.get('platform') or 'unknown').upper())
+        status = '✓' if dl.get('status') == 'success' else '✗'
+        timestamp = _escape_html(dl.get('timestamp', 'N/A'))
+        size_mb = _mb(dl.get('file_size_bytes'), 1)
+        err = _escape_html(dl.get('error_message')) if dl.get('error_message') else None
+
+        lines.append(f"{status} <b>{display}</b> - {platform} - <b>{size_mb} MB</b>")
+        lines.append(f"   🕐 <code>{timestamp}</code>")
+        if err:
+            lines.append(f"   ⚠️ Ошибка: <i>{err}</i>")
+        lines.append('')
+    return lines
+
+
+@dataclass(frozen=True)
+class _StatsView:
+    """Describe one stats command: what to fetch and how to render it."""
+
+    kind: str
+    fetch: Callable[[int], Any]
+    group_title: str
+    private_title: str
+    empty_text: str
+    render_lines: Callable[[types.Message, int, Any], Awaitable[List[str]]]
+    is_empty: Callable[[Any], bool] = operator.not_
+    denied_text: Optional[str] = None
+
+
+_STATS_VIEWS: Dict[str, _StatsView] = {
+    "stats": _StatsView(
+        kind="summary",
+        fetch=lambda chat_id: stats_service.get_summary(chat_id),
+        group_title="📊 <b>Статистика по группе ({title})</b>",
+        private_title="📊 <b>Статистика вашего диалога с ботом</b>",
+        empty_text='📊 В этом чате ещё не было загрузок.',
+        render_lines=_summary_lines,
+        is_empty=lambda stats: not (stats or {}).get('total_downloads', 0),
+    ),
+    "top_users": _StatsView(
+        kind="top_users",
+        fetch=lambda chat_id: stats_service.get_top_users(chat_id, limit=10),
+        group_title="👥 <b>Активность участников ({title})</b>",
+        private_title="👥 <b>Ваша активность в этом диалоге</b>",
+        empty_text='👥 В этом чате ещё не было загрузок.',
+        render_lines=_top_user_lines,
+    ),
+    "platforms": _StatsView(
+        kind="platforms",
+        fetch=lambda chat_id: stats_service.get_platform_stats(chat_id),
+        group_title="🌐 <b>Платформы в чате ({title})</b>",
+        private_title="🌐 <b>Платформы в вашем диалоге</b>",
+        empty_text='🌐 В этом чате ещё нет загрузок по платформам.',
+        render_lines=_platform_lines,
+    ),
+    "recent": _StatsView(
+        kind="recent",
+        fetch=lambda chat_id: stats_service.get_recent_downloads(chat_id, limit=15),
+        group_title="📥 <b>Последние загрузки ({title})</b>",
+        private_title="📥 <b>Последние загрузки в вашем диалоге</b>",
+        empty_text='📥 История загрузок пуста.',
+        render_lines=_recent_lines,
+        denied_text='🔒 Только администраторы могут просматривать последние загрузки.',
+    ),
+}
+
+
+async def _render_stats(message: types.Message, view: _StatsView) -> None:
+    """Shared flow of stats commands: scope → (admin check ‖ DB fetch) → format → reply."""
+
+    chat_id, is_group, chat_title = _resolve_scope(message)
+    loader = partial(view.fetch, chat_id)
+    fetch_task = asyncio.create_task(
+        asyncio.to_thread(stats_service.cached_stats, view.kind, chat_id, loader)
+    )
+    if view.denied_text:
+        # Проверка прав (может ходить в Telegram) и выборка из БД независимы —
+        # запускаем их параллельно, чтобы не платить за оба запроса последовательно.
+        try:
+            allowed = await is_admin(message)
+        except BaseException:
+            fetch_task.cancel()
+            raise
+        if not allowed:
+            fetch_task.cancel()
+            await message.reply(view.denied_text)
+            return
+
+    data = await fetch_task
+    if view.is_empty(data):
+        await message.reply(view.empty_text)
+        return
+
+    header = view.group_title.format(title=chat_title) if is_group else view.private_title
+    lines = [header, _SEPARATOR]
+    lines.extend(await view.render_lines(message, chat_id, data))
+    await message.reply('\n'.join(lines), parse_mode='HTML')
+
+
+async def cmd_stats(message: types.Message):
+    await _render_stats(message, _STATS_VIEWS["stats"])
+
+
+async def cmd_top_users(message: types.Message):
+    await _render_stats(message, _STATS_VIEWS["top_users"])
+
+
+async def cmd_platform_stats(message: types.Message):
+    await _render_stats(message, _STATS_VIEWS["platforms"])
+
+
+async def cmd_recent(message: types.Message):
+    await _render_stats(message, _STATS_VIEWS["recent"])
 
 
 async def cmd_user_stats(message: types.Message):
     user_id = message.from_user.id
     chat_id, is_group, _ = _resolve_scope(message)
-    stats = stats_service.get_user_stats(user_id, chat_id)
+    stats = await asyncio.to_thread(
+        stats_service.cached_stats,
+        f"user:{user_id}",
+        chat_id,
+        partial(stats_service.get_user_stats, user_id, chat_id),
+    )
 
     if not stats:
         await message.reply('📊 В этом чате у вас пока нет загрузок.')
@@ -242,48 +311,6 @@ async def cmd_user_stats(message: types.Message):
     await message.reply(text, parse_mode='HTML')
 
 
-async def cmd_recent(message: types.Message):
-    if not await is_admin(message):
-        await message.reply('🔒 Только администраторы могут просматривать последние загрузки.')
-        return
-
-    chat_id, is_group, chat_title = _resolve_scope(message)
-    downloads = stats_service.get_recent_downloads(chat_id, limit=15)
-
-    if is_group:
-        header = (
-            f"📥 <b>Последние загрузки ({chat_title})</b>\n"
-            "------------------------"
-        )
-    else:
-        header = '📥 <b>Последние загрузки в вашем диалоге</b>\n------------------------'
-
-    if not downloads:
-        await message.reply('📥 История загрузок пуста.')
-        return
-
-    lines = [header]
-    for dl in downloads:
-        uname = dl.get('username')
-        first = dl.get('first_name') if 'first_name' in dl else None
-        last = dl.get('last_name') if 'last_name' in dl else None
-        display = _display_user_name(uname, first, last, dl.get('user_id'))
-        platform = _escape_html((dl.get('platform') or 'unknown').upper())
-        status = '✓' if dl.get('status') == 'success' else '✗'
-        size_mb = _escape_html(str(round((dl.get('file_size_bytes') or 0) / (1024 * 1024), 1)))
-        timestamp = _escape_html(dl.get('timestamp', 'N/A'))
-        err = _escape_html(dl.get('error_message')) if dl.get('error_message') else None
-
-        lines.append(f"{status} <b>{display}</b> - {platform} - <b>{size_mb} MB</b>")
-        lines.append(f"   🕐 <code>{timestamp}</code>")
-        if err:
-            lines.append(f"   ⚠️ Ошибка: <i>{err}</i>")
-        lines.append('')
-
-    text = '\n'.join(lines)
-    await message.reply(text, parse_mode='HTML')
-
-
 async def cmd_referral_overview(message: types.Message, target_user_id: Optional[int] = None):
     target_id = target_user_id or message.from_user.id
     locale = get_locale(getattr(getattr(message, "from_user", None), "language_code", None))
@@ -3,17 +3,31 @@
 from __future__ import annotations
 
 import asyncio
-import html
+import functools
+import gzip
+import hashlib
+import json
 import logging
+import mmap
+import os
+import re
+import secrets
 import threading
+import time
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 from urllib.parse import quote_plus
 
 from aiohttp import web
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None  # type: ignore[assignment]
+
 import config
 from admin_panel import (
     AdminAuthManager,
@@ -24,12 +38,191 @@ from admin_panel import (
 )
 from admin_panel import admin_panel_ui as admin_ui
 
-CHAT_SORT_FIELDS = {"recent", "downloads", "data", "errors", "name"}
-METRIC_SORT_FIELDS = {"downloads", "data", "errors", "name"}
+CHAT_SORT_OPTIONS = {
+    "recent": "По активности",
+    "downloads": "По загрузкам",
+    "data": "По объёму",
+    "errors": "По ошибкам",
+    "name": "По названию",
+}
+METRIC_SORT_OPTIONS = {
+    "downloads": "По загрузкам",
+    "data": "По объёму",
+    "errors": "По ошибкам",
+    "name": "По имени",
+}
+CHAT_SORT_FIELDS = frozenset(CHAT_SORT_OPTIONS)
+METRIC_SORT_FIELDS = frozenset(METRIC_SORT_OPTIONS)
+# Сколько сжатых JSON-ответов дашборда держать в памяти (ключ — ETag снимка).
+_JSON_GZIP_CACHE_SIZE = 32
+# Порог, после которого накопленные части страницы отправляются клиенту одной записью.
+_STREAM_FLUSH_BYTES = 8 * 1024
+# Один проход по строке вместо двух поисков подстроки для ERROR и CRITICAL.
+_ERROR_LEVEL_RE = re.compile(rb" \| (?:ERROR|CRITICAL) \| ")
+# Сколько секунд собранный снимок дашборда переиспользуется для одинаковых запросов.
+DASHBOARD_CACHE_TTL_SECONDS = float(getattr(config, "ADMIN_PANEL_CACHE_TTL_SECONDS", 3))
+
+# Шаблон компилируется один раз при импорте: auto_reload выключен, чтобы Jinja
+# не проверяла mtime файла, а форматтеры доступны прямо в шаблоне как фильтры.
+_TEMPLATE_DIR = Path(__file__).with_name("admin_panel") / "templates"
+_TEMPLATE_ENV = Environment(
+    loader=FileSystemLoader(str(_TEMPLATE_DIR)),
+    autoescape=select_autoescape(["html", "xml"]),
+    auto_reload=False,
+    cache_size=-1,
+)
+_TEMPLATE_ENV.filters["bytes"] = admin_ui.format_bytes
+_TEMPLATE_ENV.filters["ratio"] = admin_ui.format_ratio
+_TEMPLATE_ENV.filters["thousands"] = "{:,}".format
+_DASHBOARD_TEMPLATE = _TEMPLATE_ENV.get_template("dashboard.html")
+
+# Варианты <select> для сортировок статичны: HTML для каждого выбранного значения
+# готовится заранее, на запрос остаётся поиск в словаре.
+_CHAT_SORT_OPTIONS_HTML = {
+    current: admin_ui.render_select_options(CHAT_SORT_OPTIONS, current)
+    for current in CHAT_SORT_OPTIONS
+}
+_METRIC_SORT_OPTIONS_HTML = {
+    current: admin_ui.render_select_options(METRIC_SORT_OPTIONS, current)
+    for current in METRIC_SORT_OPTIONS
+}
+# Значения сортировок ограничены закрытыми наборами, поэтому их URL-кодировка
+# вычисляется один раз при импорте.
+_QUOTE_CACHE = {value: quote_plus(value) for value in CHAT_SORT_FIELDS | METRIC_SORT_FIELDS}
+_DASHBOARD_JS = admin_ui.render_dashboard_js()
+# Настройки не меняются во время работы процесса, поэтому читаются один раз при импорте.
+_HEALTH_ENDPOINT = (
+    f"{getattr(config, 'HEALTHCHECK_HOST', '0.0.0.0')}:{getattr(config, 'HEALTHCHECK_PORT', 8080)}"
+)
+_LOG_FILE: Optional[Path] = (
+    Path(config.LOG_FILE) if getattr(config, "LOG_FILE", None) else None
+)
+
+# Стили не зависят от данных, поэтому отдаются отдельным кэшируемым ресурсом,
+# а не встраиваются в каждую страницу.
+_CSS = (Path(__file__).with_name("admin_panel") / "static" / "dashboard.css").read_bytes()
+_CSS_ETAG = f'"{hashlib.md5(_CSS).hexdigest()}"'
+_CSS_VERSION = _CSS_ETAG.strip('"')[:12]
+_CSS_HEADERS = {"Cache-Control": "public, max-age=86400", "ETag": _CSS_ETAG}
+
+
+def _json_default(obj: Any) -> Any:
+    # Даты сериализуются одинаково с orjson и без него: ISO 8601 как у isoformat().
+    isoformat = getattr(obj, "isoformat", None)
+    if callable(isoformat):
+        return isoformat()
+    return str(obj)
+
+
+def _dumps_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        payload, default=_json_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Check Accept-Encoding for gzip, honouring q-values (``gzip;q=0`` refuses it)."""
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _loads_json(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_response(
+    payload: Any, *, status: int = 200, headers: Optional[Dict[str, str]] = None
+) -> web.Response:
+    return web.Response(
+        body=_dumps_json(payload),
+        status=status,
+        content_type="application/json",
+        headers=headers,
+    )
+
+
+def _tail_error_lines(path: Path, max_lines: int) -> List[str]:
+    """Просматривает файл лога с конца через mmap и возвращает последние ERROR/CRITICAL строки.
+
+    Строки возвращаются от новых к старым. Поиск идёт по байтам отображённого файла,
+    декодируются только совпавшие строки, а ОС подгружает лишь страницы хвоста.
+    """
+    found: List[str] = []
+    if max_lines <= 0:
+        return found
+    with path.open("rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return found
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = len(mapped)
+            while end > 0 and len(found) < max_lines:
+                start = mapped.rfind(b"\n", 0, end) + 1
+                if _ERROR_LEVEL_RE.search(mapped, start, end):
+                    found.append(mapped[start:end].decode("utf-8", errors="ignore").strip())
+                end = start - 1
+    return found
+
+
+def _parse_log_line(entry: str) -> Dict[str, str]:
+    # Строка лога: "время | уровень | логгер | сообщение"; в сообщении могут быть свои "|",
+    # поэтому разбиение ограничено тремя разделителями. Строка уже обрезана по краям,
+    # так что у сообщения достаточно снять пробелы слева.
+    parts = entry.split("|", 3)
+    if len(parts) != 4:
+        return {"timestamp": "", "level": "ERROR", "logger": "", "message": entry}
+    ts, level, logger_name, message = parts
+    return {
+        "timestamp": ts.strip(),
+        "level": level.strip(),
+        "logger": logger_name.strip(),
+        "message": message.lstrip(),
+    }
+
+
+class _ErrorTailHandler(logging.Handler):
+    """Хранит последние ERROR/CRITICAL записи в памяти для блока логов на дашборде."""
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__(level=logging.ERROR)
+        self._records: deque[Dict[str, str]] = deque(maxlen=capacity)
+        self._time_formatter = logging.Formatter()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._records.append(
+                {
+                    "timestamp": self._time_formatter.formatTime(record),
+                    "level": record.levelname,
+                    "logger": record.name,
+                    "message": record.getMessage(),
+                }
+            )
+        except Exception:
+            self.handleError(record)
+
+    def snapshot(self, max_lines: int) -> List[Dict[str, str]]:
+        with self.lock:
+            records = list(self._records)
+        return records[::-1][:max_lines]
 
 
 class AdminPanelServer:
-    """Отдельный поток с aiohttp-приложением для просмотра статистики."""
+    """aiohttp-приложение со статистикой: на цикле бота или в отдельном потоке."""
 
     def __init__(
         self,
@@ -45,10 +238,14 @@ class AdminPanelServer:
         self._port = port
         self._runner: web.AppRunner | None = None
         self._thread: threading.Thread | None = None
+        self._serve_task: asyncio.Task | None = None
+        self._serve_future: Future | None = None
+        self._bot_loop = bot_loop
         self._loop: asyncio.AbstractEventLoop | None = None
         self._shutdown_event: asyncio.Event | None = None
         self._logger = logging.getLogger(__name__)
         self._log_tail = 50
+        self._error_tail = _ErrorTailHandler(self._log_tail)
         self._auth = AdminAuthManager(
             access_token=access_token,
             admin_accounts=admin_accounts,
@@ -61,28 +258,94 @@ class AdminPanelServer:
             log_reader=self._read_error_logs,
             logger=self._logger,
         )
-        template_dir = Path(__file__).with_name("admin_panel") / "templates"
-        self._template_env = Environment(
-            loader=FileSystemLoader(str(template_dir)),
-            autoescape=select_autoescape(["html", "xml"]),
-        )
-        self._dashboard_template = self._template_env.get_template("dashboard.html")
+        self._dashboard_template = _DASHBOARD_TEMPLATE
+        # Отдельный небольшой пул для синхронных выборок из БД и чтения логов,
+        # чтобы они не блокировали цикл событий админки; создаётся при запуске сервера.
+        self._executor: ThreadPoolExecutor | None = None
+        # Кэш снимков дашборда: параллельные обновления с одинаковыми параметрами
+        # ждут одну и ту же выборку, а повторные в пределах TTL берут готовый результат.
+        self._dashboard_cache: Dict[tuple, tuple[float, Dict[str, Any]]] = {}
+        self._dashboard_inflight: Dict[tuple, asyncio.Future] = {}
+        self._dashboard_cache_hits = 0
+        # Тело JSON сжимается один раз на снимок: опросы в пределах TTL получают готовый gzip.
+        self._json_gzip_cache: Dict[str, bytes] = {}
+        # Соль ETag меняется при каждом запуске, чтобы новая версия панели
+        # не отдавала 304 на страницы, закэшированные прежней.
+        self._etag_salt = secrets.token_hex(4)
+        # Приложение и таблица маршрутов собираются один раз и переиспользуются
+        # при повторных запусках сервера после shutdown.
+        self._app = self._build_app()
+        self._app_loop: asyncio.AbstractEventLoop | None = None
+        self._thread_loop: asyncio.AbstractEventLoop | None = None
 
     # ---------- Публичные методы ----------
     def ensure_running(self) -> None:
-        if self._thread and self._thread.is_alive():
+        if (
+            (self._thread and self._thread.is_alive())
+            or (self._serve_task and not self._serve_task.done())
+            or (self._serve_future and not self._serve_future.done())
+        ):
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="admin-db")
+        logging.getLogger().addHandler(self._error_tail)
+
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if self._bot_loop is not None and running_loop is self._bot_loop:
+            # Запуск из цикла бота: aiohttp работает на нём же, без отдельного потока,
+            # а синхронные выборки из БД уходят в пул self._executor.
+            self._loop = self._bot_loop
+            self._serve_task = self._bot_loop.create_task(self._run_app())
+            self._logger.info(
+                "Admin panel server listening on %s:%s (bot loop)", self._host, self._port
+            )
+            return
+        if self._bot_loop is not None and running_loop is None and self._bot_loop.is_running():
+            # Вызов из другого потока при уже работающем цикле бота: приложение всё равно
+            # размещается на нём, отдельный поток с собственным циклом не нужен.
+            self._loop = self._bot_loop
+            self._serve_future = asyncio.run_coroutine_threadsafe(self._run_app(), self._bot_loop)
+            self._logger.info(
+                "Admin panel server listening on %s:%s (bot loop)", self._host, self._port
+            )
             return
 
         def _run(loop: asyncio.AbstractEventLoop) -> None:
             asyncio.set_event_loop(loop)
             loop.run_until_complete(self._run_app())
 
-        self._loop = asyncio.new_event_loop()
+        if self._thread_loop is None or self._thread_loop.is_closed():
+            self._thread_loop = asyncio.new_event_loop()
+        self._loop = self._thread_loop
         self._thread = threading.Thread(target=_run, args=(self._loop,), daemon=True)
         self._thread.start()
         self._logger.info("Admin panel server listening on %s:%s", self._host, self._port)
 
     def shutdown(self, timeout: float = 5.0) -> None:
+        if self._serve_task is not None:
+            # На общем цикле дождаться остановки синхронно нельзя: сигналим и выходим,
+            # cleanup завершится в задаче (или используйте shutdown_async).
+            self._stop_serving()
+            self._release_resources()
+            return
+
+        future = self._serve_future
+        if future is not None:
+            loop = self._loop
+            if self._on_loop(loop) or loop is None:
+                self._stop_serving()
+            else:
+                loop.call_soon_threadsafe(self._stop_serving)
+                try:
+                    future.result(timeout=timeout)
+                except Exception:
+                    self._logger.warning("Admin panel server did not stop cleanly within timeout")
+            self._release_resources()
+            return
+
         thread = self._thread
         if not thread:
             return
@@ -94,21 +357,75 @@ class AdminPanelServer:
         if thread.is_alive():
             self._logger.warning("Admin panel server thread did not stop within timeout")
 
+        self._release_resources()
+
+    async def shutdown_async(self, timeout: float = 5.0) -> None:
+        task = self._serve_task
+        if task is None and self._serve_future is not None and self._on_loop(self._loop):
+            task = asyncio.wrap_future(self._serve_future)
+        if task is None:
+            await asyncio.to_thread(self.shutdown, timeout)
+            return
+
+        self._stop_serving()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._logger.warning("Admin panel server did not stop within timeout")
+            task.cancel()
+        except Exception:
+            self._logger.exception("Admin panel server stopped with error")
+        self._release_resources()
+
+    def _stop_serving(self) -> None:
+        task = self._serve_task or self._serve_future
+        if task is None or task.done():
+            return
+        if self._shutdown_event is not None:
+            self._shutdown_event.set()
+        else:
+            task.cancel()
+
+    @staticmethod
+    def _on_loop(loop: asyncio.AbstractEventLoop | None) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _release_resources(self) -> None:
+        logging.getLogger().removeHandler(self._error_tail)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._serve_task = None
+        self._serve_future = None
         self._thread = None
         self._loop = None
         self._shutdown_event = None
 
     # ---------- aiohttp-приложение ----------
-    async def _run_app(self) -> None:
+    def _build_app(self) -> web.Application:
         app = web.Application()
         app.router.add_get("/admin", self._handle_dashboard)
+        app.router.add_get("/admin/style.css", self._handle_css)
         app.router.add_get("/admin/api/dashboard", self._handle_dashboard_json)
         app.router.add_post("/admin/api/actions/{action}", self._handle_action)
-        self._runner = web.AppRunner(app)
+        return app
+
+    async def _run_app(self) -> None:
+        self._shutdown_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if self._app_loop is not None and self._app_loop is not loop:
+            # aiohttp привязывает приложение к циклу первого запуска.
+            self._app = self._build_app()
+        self._app_loop = loop
+        # Дашборд часто опрашивается одними и теми же клиентами: держим соединения
+        # открытыми дольше и не пишем access-лог на каждый запрос.
+        self._runner = web.AppRunner(self._app, keepalive_timeout=75, access_log=None)
         await self._runner.setup()
-        site = web.TCPSite(self._runner, host=self._host, port=self._port)
+        site = web.TCPSite(self._runner, host=self._host, port=self._port, backlog=256)
         await site.start()
-        self._shutdown_event = asyncio.Event()
         try:
             await self._shutdown_event.wait()
         finally:
@@ -129,16 +446,23 @@ class AdminPanelServer:
             return web.Response(status=401, text=body, content_type="text/html")
         return web.Response(status=401, text="unauthorized", content_type="text/plain")
 
-    def _parse_chat_id(self, request: web.Request) -> Optional[int]:
-        value = request.rel_url.query.get("chat_id")
-        if not value:
-            return None
+    def _parse_dashboard_query(
+        self, query: Mapping[str, str]
+    ) -> Tuple[Optional[int], str, str, str, Optional[str]]:
+        """Возвращает chat_id, сортировки и поисковую строку из параметров запроса."""
         try:
-            return int(value)
+            chat_id = int(raw_chat) if (raw_chat := query.get("chat_id")) else None
         except ValueError:
-            return None
+            chat_id = None
+        chat_sort = value if (value := query.get("chat_sort")) in CHAT_SORT_FIELDS else "recent"
+        top_sort = value if (value := query.get("top_sort")) in METRIC_SORT_FIELDS else "downloads"
+        platform_sort = (
+            value if (value := query.get("platform_sort")) in METRIC_SORT_FIELDS else "downloads"
+        )
+        search_query = (query.get("search") or "").strip() or None
+        return chat_id, chat_sort, top_sort, platform_sort, search_query
 
-    def _collect_dashboard(
+    async def _collect_dashboard(
         self,
         chat_id: Optional[int],
         chat_sort: str,
@@ -146,25 +470,92 @@ class AdminPanelServer:
         platform_sort: str,
         search_query: Optional[str],
         admin_identity: Optional[AdminIdentity],
-    ) -> Dict[str, object]:
-        data = self._data_provider.collect_dashboard(
-            chat_id=chat_id,
-            chat_sort=chat_sort,
-            top_sort=top_sort,
-            platform_sort=platform_sort,
-            search_query=search_query,
-            log_tail=self._log_tail,
-        )
+    ) -> Tuple[Dict[str, object], str]:
+        """Возвращает данные дашборда и дайджест снимка, из которого они собраны."""
+        key = (chat_id, chat_sort, top_sort, platform_sort, search_query)
+        cached = self._dashboard_cache.get(key)
+        if cached and time.monotonic() - cached[0] < DASHBOARD_CACHE_TTL_SECONDS:
+            self._dashboard_cache_hits += 1
+            snapshot, digest = cached[1]
+        else:
+            pending = self._dashboard_inflight.get(key)
+            if pending is None:
+                pending = asyncio.ensure_future(
+                    self._build_snapshot(
+                        chat_id=chat_id,
+                        chat_sort=chat_sort,
+                        top_sort=top_sort,
+                        platform_sort=platform_sort,
+                        search_query=search_query,
+                        log_tail=self._log_tail,
+                        executor=self._executor,
+                    )
+                )
+                self._dashboard_inflight[key] = pending
+                pending.add_done_callback(functools.partial(self._store_dashboard, key))
+            else:
+                self._dashboard_cache_hits += 1
+            snapshot, digest = await asyncio.shield(pending)
+
+        # Снимок общий для всех запросов, поэтому данные сессии добавляются в копию.
+        data = dict(snapshot)
         data["admin_identity"] = admin_identity.display if admin_identity else None
         data["multi_admin"] = self._auth.multi_admin_enabled()
-        return data
+        return data, digest
+
+    async def _build_snapshot(self, **kwargs: Any) -> Tuple[Dict[str, Any], str]:
+        snapshot = await self._data_provider.collect_dashboard(**kwargs)
+        # Дайджест содержимого считается один раз на снимок и служит основой ETag.
+        digest = hashlib.md5(_dumps_json(snapshot)).hexdigest()[:16]
+        return snapshot, digest
+
+    def _dashboard_etag(self, digest: str, *variant: object) -> str:
+        variant_hash = hashlib.md5(
+            "|".join(map(str, (self._etag_salt, *variant))).encode("utf-8")
+        ).hexdigest()[:8]
+        return f'W/"{digest}-{variant_hash}"'
+
+    def _not_modified(
+        self, request: web.Request, etag: str, auth: AuthResult
+    ) -> Optional[web.Response]:
+        if_none_match = request.headers.get("If-None-Match")
+        if not if_none_match or etag not in {tag.strip() for tag in if_none_match.split(",")}:
+            return None
+        response = web.Response(status=304, headers=self._dashboard_headers(etag))
+        self._auth.attach_cookies(response, auth)
+        return response
 
-    def _resolve_sort(self, value: Optional[str], allowed: Set[str], default: str) -> str:
-        if not value:
-            return default
-        return value if value in allowed else default
+    @staticmethod
+    def _dashboard_headers(etag: str) -> Dict[str, str]:
+        return {"ETag": etag, "Cache-Control": "private, max-age=2"}
 
-    async def _handle_dashboard(self, request: web.Request) -> web.Response:
+    def _invalidate_dashboard_cache(self) -> None:
+        self._dashboard_cache.clear()
+        # Снимки, которые собираются прямо сейчас, отражают состояние до изменения:
+        # их результат дойдёт до ожидающих запросов, но в кэш уже не попадёт.
+        self._dashboard_inflight.clear()
+        self._json_gzip_cache.clear()
+
+    def _store_dashboard(self, key: tuple, future: asyncio.Future) -> None:
+        if self._dashboard_inflight.get(key) is not future:
+            return
+        del self._dashboard_inflight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        now = time.monotonic()
+        expired = [
+            cache_key
+            for cache_key, (stored_at, _) in self._dashboard_cache.items()
+            if now - stored_at >= DASHBOARD_CACHE_TTL_SECONDS
+        ]
+        for cache_key in expired:
+            del self._dashboard_cache[cache_key]
+        self._dashboard_cache[key] = (now, future.result())
+        self._logger.debug(
+            "Dashboard snapshot refreshed (cache hits so far: %s)", self._dashboard_cache_hits
+        )
+
+    async def _handle_dashboard(self, request: web.Request) -> web.StreamResponse:
         query = request.rel_url.query
         if self._auth.multi_admin_enabled() and query.get("logout") == "1":
             return self._auth.logout_response()
@@ -172,18 +563,11 @@ class AdminPanelServer:
         auth = self._auth.authorize(request)
         if not auth.ok:
             return self._unauthorized()
-        chat_id = self._parse_chat_id(request)
-        chat_sort = self._resolve_sort(query.get("chat_sort"), CHAT_SORT_FIELDS, "recent")
-        top_sort = self._resolve_sort(query.get("top_sort"), METRIC_SORT_FIELDS, "downloads")
-        platform_sort = self._resolve_sort(query.get("platform_sort"), METRIC_SORT_FIELDS, "downloads")
-
-        search_query = query.get("search")
-        if search_query:
-            search_query = search_query.strip()
-        if search_query == "":
-            search_query = None
-
-        dashboard = self._collect_dashboard(
+        chat_id, chat_sort, top_sort, platform_sort, search_query = (
+            self._parse_dashboard_query(query)
+        )
+
+        dashboard, digest = await self._collect_dashboard(
             chat_id=chat_id,
             chat_sort=chat_sort,
             top_sort=top_sort,
@@ -191,26 +575,54 @@ class AdminPanelServer:
             search_query=search_query,
             admin_identity=auth.identity,
         )
-        token_param = query.get("token") if (query.get("token") and not self._auth.multi_admin_enabled()) else None
-        html_body = self._render_dashboard(dashboard, token_param)
-        response = web.Response(text=html_body, content_type="text/html")
+        token_param = (
+            query.get("token")
+            if (query.get("token") and not self._auth.multi_admin_enabled())
+            else None
+        )
+        etag = self._dashboard_etag(digest, "html", dashboard["admin_identity"], token_param)
+        not_modified = self._not_modified(request, etag, auth)
+        if not_modified is not None:
+            return not_modified
+        # Страница отдаётся по частям прямо из генератора шаблона: браузер начинает
+        # разбирать заголовок, пока строки таблиц ещё рендерятся.
+        response = web.StreamResponse(headers=self._dashboard_headers(etag))
+        response.content_type = "text/html"
+        response.charset = "utf-8"
+        response.enable_compression()
         self._auth.attach_cookies(response, auth)
+        await response.prepare(request)
+        # Шаблон отдаёт десятки мелких кусков; они копятся до _STREAM_FLUSH_BYTES,
+        # чтобы не платить за write/drain и сжатие на каждый фрагмент.
+        buffer: List[str] = []
+        buffered = 0
+        for chunk in self._render_dashboard(dashboard, token_param):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= _STREAM_FLUSH_BYTES:
+                await response.write("".join(buffer).encode("utf-8"))
+                buffer.clear()
+                buffered = 0
+        if buffer:
+            await response.write("".join(buffer).encode("utf-8"))
+        await response.write_eof()
         return response
 
+    async def _handle_css(self, request: web.Request) -> web.Response:
+        if request.headers.get("If-None-Match") == _CSS_ETAG:
+            return web.Response(status=304, headers=_CSS_HEADERS)
+        return web.Response(body=_CSS, content_type="text/css", headers=_CSS_HEADERS)
+
     async def _handle_dashboard_json(self, request: web.Request) -> web.Response:
         query = request.rel_url.query
         auth = self._auth.authorize(request)
         if not auth.ok:
             return self._unauthorized()
-        chat_id = self._parse_chat_id(request)
-        chat_sort = self._resolve_sort(query.get("chat_sort"), CHAT_SORT_FIELDS, "recent")
-        top_sort = self._resolve_sort(query.get("top_sort"), METRIC_SORT_FIELDS, "downloads")
-        platform_sort = self._resolve_sort(query.get("platform_sort"), METRIC_SORT_FIELDS, "downloads")
-        search_query = query.get("search")
-        if search_query:
-            search_query = search_query.strip() or None
-
-        dashboard = self._collect_dashboard(
+        chat_id, chat_sort, top_sort, platform_sort, search_query = (
+            self._parse_dashboard_query(query)
+        )
+
+        dashboard, digest = await self._collect_dashboard(
             chat_id=chat_id,
             chat_sort=chat_sort,
             top_sort=top_sort,
@@ -218,7 +630,23 @@ class AdminPanelServer:
             search_query=search_query,
             admin_identity=auth.identity,
         )
-        response = web.json_response(dashboard)
+        etag = self._dashboard_etag(digest, "json", dashboard["admin_identity"])
+        not_modified = self._not_modified(request, etag, auth)
+        if not_modified is not None:
+            return not_modified
+        headers = self._dashboard_headers(etag)
+        headers["Vary"] = "Accept-Encoding"
+        if _accepts_gzip(request.headers.get("Accept-Encoding", "")):
+            body = self._json_gzip_cache.get(etag)
+            if body is None:
+                body = gzip.compress(_dumps_json(dashboard), compresslevel=6, mtime=0)
+                if len(self._json_gzip_cache) >= _JSON_GZIP_CACHE_SIZE:
+                    del self._json_gzip_cache[next(iter(self._json_gzip_cache))]
+                self._json_gzip_cache[etag] = body
+            headers["Content-Encoding"] = "gzip"
+            response = web.Response(body=body, content_type="application/json", headers=headers)
+        else:
+            response = _json_response(dashboard, headers=headers)
         self._auth.attach_cookies(response, auth)
         return response
 
@@ -227,23 +655,27 @@ class AdminPanelServer:
         if not auth.ok:
             return self._unauthorized()
         action = request.match_info.get("action", "")
+        raw = await request.read()
         try:
-            payload = await request.json()
-        except Exception:
+            payload = _loads_json(raw) if raw else {}
+        except ValueError:
             payload = {}
         try:
             result = self._runtime.perform_action(action, payload)
         except ValueError as exc:
-            return web.json_response({"ok": False, "error": str(exc)}, status=400)
+            return _json_response({"ok": False, "error": str(exc)}, status=400)
         except Exception:
             self._logger.exception("Admin action %s failed", action)
-            return web.json_response({"ok": False, "error": "internal error"}, status=500)
-        response = web.json_response({"ok": True, **result})
+            return _json_response({"ok": False, "error": "internal error"}, status=500)
+        self._invalidate_dashboard_cache()
+        response = _json_response({"ok": True, **result})
         self._auth.attach_cookies(response, auth)
         return response
 
     # ---------- HTML ----------
-    def _render_dashboard(self, data: Dict[str, object], access_token: Optional[str]) -> str:
+    def _render_dashboard(
+        self, data: Dict[str, object], access_token: Optional[str]
+    ) -> Iterator[str]:
         summary: Dict[str, object] = data["summary"]  # type: ignore[assignment]
         top_users: List[Dict[str, object]] = data["top_users"]  # type: ignore[assignment]
         platforms: List[Dict[str, object]] = data["platforms"]  # type: ignore[assignment]
@@ -269,59 +701,55 @@ class AdminPanelServer:
         total_bytes = int(summary.get("total_bytes", 0) or 0)
         unique_users = int(summary.get("unique_users", 0) or 0)
         last_activity = summary.get("last_activity")
-        health_endpoint = f"{getattr(config, 'HEALTHCHECK_HOST', '0.0.0.0')}:{getattr(config, 'HEALTHCHECK_PORT', 8080)}"
-
-        def build_query(overrides: Dict[str, Optional[str]]) -> str:
-            base = {
-                "chat_id": str(chat_id) if chat_id is not None else None,
-                "chat_sort": chat_sort,
-                "top_sort": top_sort,
-                "platform_sort": platform_sort,
-                "search": search_query or None,
-            }
-            base.update({k: (None if v in (None, "") else str(v)) for k, v in overrides.items()})
-            parts = []
-            for key, value in base.items():
-                if value is None:
-                    continue
-                parts.append(f"{key}={quote_plus(value)}")
-            if access_token:
-                parts.append(f"token={quote_plus(access_token)}")
-            return "&".join(parts)
-
-        def build_link(overrides: Dict[str, Optional[str]]) -> str:
-            query = build_query(overrides)
-            return f"/admin?{query}" if query else "/admin"
 
-        chat_sort_options = {
-            "recent": "По активности",
-            "downloads": "По загрузкам",
-            "data": "По объёму",
-            "errors": "По ошибкам",
-            "name": "По названию",
-        }
-        metric_sort_options = {
-            "downloads": "По загрузкам",
-            "data": "По объёму",
-            "errors": "По ошибкам",
-            "name": "По имени",
+        # Неизменные параметры экранируются один раз; build_query лишь подменяет
+        # переопределённые ключи, сохраняя исходный порядок параметров.
+        quote_sort = _QUOTE_CACHE.get
+        base_parts: Dict[str, Optional[str]] = {
+            "chat_id": f"chat_id={quote_plus(str(chat_id))}" if chat_id is not None else None,
+            "chat_sort": f"chat_sort={quote_sort(chat_sort) or quote_plus(chat_sort)}",
+            "top_sort": f"top_sort={quote_sort(top_sort) or quote_plus(top_sort)}",
+            "platform_sort": (
+                f"platform_sort={quote_sort(platform_sort) or quote_plus(platform_sort)}"
+            ),
+            "search": f"search={quote_plus(search_query)}" if search_query else None,
         }
+        token_part = f"token={quote_plus(access_token)}" if access_token else None
+
+        # Кэш живёт в пределах одного рендера: одинаковые наборы переопределений
+        # (например, сброс chat_id) собираются один раз.
+        @functools.cache
+        def build_query(overrides: Tuple[Tuple[str, Optional[str]], ...]) -> str:
+            parts = dict(base_parts)
+            for key, value in overrides:
+                parts[key] = None if value in (None, "") else f"{key}={quote_plus(str(value))}"
+            parts["token"] = token_part
+            return "&".join(part for part in parts.values() if part)
+
+        def build_link(**overrides: Optional[str]) -> str:
+            query = build_query(tuple(overrides.items()))
+            return f"/admin?{query}" if query else "/admin"
+
+        # Ссылки строк таблицы чатов отличаются только chat_id, поэтому остальная
+        # часть запроса собирается и экранируется один раз на рендер.
+        chat_link_suffix = build_query((("chat_id", None),))
+        global_chat_link = build_link(chat_id=None)
+
+        def chat_link(cid: Optional[object]) -> str:
+            if cid is None or cid == "":
+                return global_chat_link
+            chat_param = f"chat_id={quote_plus(str(cid))}"
+            if not chat_link_suffix:
+                return f"/admin?{chat_param}"
+            return f"/admin?{chat_param}&{chat_link_suffix}"
 
-        logout_link = build_link({"logout": "1"})
+        logout_link = build_link(logout="1")
         identity_html = admin_ui.render_identity_badge(
             admin_identity_label,
             logout_link=logout_link,
             multi_admin=multi_admin,
         )
 
-        cards_html = admin_ui.render_summary_cards(
-            total_downloads=total_downloads,
-            successful=successful,
-            failed=failed,
-            total_bytes=total_bytes,
-            unique_users=unique_users,
-        )
-
         queue_section_html = admin_ui.render_queue_section(runtime_state)
         failures_section_html = admin_ui.render_failures_section(failures)
         top_rows = admin_ui.render_top_rows(top_users)
@@ -335,7 +763,7 @@ class AdminPanelServer:
             unique_users=unique_users,
             total_bytes=total_bytes,
             last_activity=last_activity,
-            build_link=build_link,
+            chat_link=chat_link,
         )
         logs_html = admin_ui.render_logs_list(error_logs)
         alerts_html = admin_ui.render_alerts_section(alerts)
@@ -351,33 +779,33 @@ class AdminPanelServer:
         health_html = admin_ui.render_health_section(
             health_info=health_info,
             fallback_metrics=fallback_metrics,
-            health_endpoint=health_endpoint,
+            health_endpoint=_HEALTH_ENDPOINT,
         )
 
         chat_value = str(chat_id) if chat_id is not None else ""
         search_value = search_query
-        token_input = (
-            f"<input type=\"hidden\" name=\"token\" value=\"{html.escape(access_token)}\" />"
-            if (access_token and not multi_admin)
-            else ""
-        )
-        chat_sort_options_html = admin_ui.render_select_options(chat_sort_options, chat_sort)
-        top_sort_options_html = admin_ui.render_select_options(metric_sort_options, top_sort)
-        platform_sort_options_html = admin_ui.render_select_options(metric_sort_options, platform_sort)
-        dashboard_js = admin_ui.render_dashboard_js()
+        hidden_token = access_token if (access_token and not multi_admin) else None
+        chat_sort_options_html = _CHAT_SORT_OPTIONS_HTML[chat_sort]
+        top_sort_options_html = _METRIC_SORT_OPTIONS_HTML[top_sort]
+        platform_sort_options_html = _METRIC_SORT_OPTIONS_HTML[platform_sort]
 
-        reset_link = build_link({"chat_id": None, "search": None})
+        reset_link = build_link(chat_id=None, search=None)
         context = {
             "scope": scope,
+            "css_version": _CSS_VERSION,
             "identity_html": identity_html,
             "chat_value": chat_value,
             "search_value": search_value,
             "chat_sort_options_html": chat_sort_options_html,
             "top_sort_options_html": top_sort_options_html,
             "platform_sort_options_html": platform_sort_options_html,
-            "token_input": token_input,
+            "hidden_token": hidden_token,
             "reset_link": reset_link,
-            "cards_html": cards_html,
+            "total_downloads": total_downloads,
+            "successful": successful,
+            "failed": failed,
+            "total_bytes": total_bytes,
+            "unique_users": unique_users,
             "queue_section_html": queue_section_html,
             "chat_table": chat_table,
             "top_rows": top_rows,
@@ -387,40 +815,23 @@ class AdminPanelServer:
             "health_html": health_html,
             "alerts_html": alerts_html,
             "logs_html": logs_html,
-            "dashboard_js": dashboard_js,
+            "dashboard_js": _DASHBOARD_JS,
         }
-        return self._dashboard_template.render(**context)
+        return self._dashboard_template.generate(**context)
 
     def _read_error_logs(self, max_lines: int) -> List[Dict[str, str]]:
-        log_path = getattr(config, "LOG_FILE", None)
-        if not log_path:
+        # Ошибки, пойманные с момента запуска панели, берутся из памяти; файл лога
+        # читается только пока буфер пуст (например, сразу после рестарта).
+        recent = self._error_tail.snapshot(max_lines)
+        if recent:
+            return recent
+        path = _LOG_FILE
+        if path is None or not path.exists():
             return []
-        path = Path(log_path)
-        if not path.exists():
-            return []
-        errors = deque(maxlen=max_lines)
         try:
-            with path.open("r", encoding="utf-8", errors="ignore") as handle:
-                for line in handle:
-                    if " | ERROR | " in line or " | CRITICAL | " in line:
-                        errors.append(line.strip())
+            errors = _tail_error_lines(path, max_lines)
         except Exception as exc:
             self._logger.debug("Не удалось прочитать лог: %s", exc)
             return []
 
-        parsed: List[Dict[str, str]] = []
-        for entry in reversed(errors):
-            parts = [part.strip() for part in entry.split("|", 3)]
-            if len(parts) >= 4:
-                ts, level, logger_name, message = parts[:4]
-            else:
-                ts, level, logger_name, message = "", "ERROR", "", entry
-            parsed.append(
-                {
-                    "timestamp": ts,
-                    "level": level,
-                    "logger": logger_name,
-                    "message": message,
-                }
-            )
-        return parsed
\ No newline at end of file
+        return [_parse_log_line(entry) for entry in errors]
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""Add downloads indexes for dashboard queries"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_05_add_download_indexes"
+down_revision = "20241214_04_add_health_alerts"
+branch_labels = None
+depends_on = None
+
+# На PostgreSQL индексы строятся CONCURRENTLY вне транзакции, не блокируя запись
+# в таблицы на время миграции; остальные СУБД эти опции игнорируют.
+CREATE_OPTS = {"postgresql_concurrently": True, "if_not_exists": True}
+DROP_OPTS = {"postgresql_concurrently": True, "if_exists": True}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_downloads_timestamp", "downloads", ["timestamp"], **CREATE_OPTS)
+        op.create_index(
+            "ix_downloads_chat_id_ts", "downloads", ["chat_id", "timestamp"], **CREATE_OPTS
+        )
+        op.create_index(
+            "ix_downloads_user_id_ts", "downloads", ["user_id", "timestamp"], **CREATE_OPTS
+        )
+        op.create_index(
+            "ix_downloads_platform_status", "downloads", ["platform", "status"], **CREATE_OPTS
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_downloads_platform_status", table_name="downloads", **DROP_OPTS)
+        op.drop_index("ix_downloads_user_id_ts", table_name="downloads", **DROP_OPTS)
+        op.drop_index("ix_downloads_chat_id_ts", table_name="downloads", **DROP_OPTS)
+        op.drop_index("ix_downloads_timestamp", table_name="downloads", **DROP_OPTS)
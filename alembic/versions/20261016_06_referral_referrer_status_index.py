@@ -0,0 +1,45 @@
+"""Replace referrer index on referral_events with a covering (referrer_user_id, status) index"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_06_referral_referrer_status_index"
+down_revision = "20261016_05_add_download_indexes"
+branch_labels = None
+depends_on = None
+
+# См. 20261016_05: индексы на PostgreSQL строятся и удаляются CONCURRENTLY.
+CREATE_OPTS = {"postgresql_concurrently": True, "if_not_exists": True}
+DROP_OPTS = {"postgresql_concurrently": True, "if_exists": True}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # referral_leaderboard группирует по referrer_user_id и суммирует status и бонусы:
+        # с INCLUDE PostgreSQL отвечает index-only scan без чтения строк таблицы.
+        op.create_index(
+            "ix_referral_events_leaderboard",
+            "referral_events",
+            ["referrer_user_id", "status"],
+            postgresql_include=["reward_daily_bonus", "reward_monthly_bonus"],
+            **CREATE_OPTS,
+        )
+        # Ведущая колонка составного индекса обслуживает те же запросы, что и старый индекс.
+        op.drop_index(
+            "ix_referral_events_referrer_user_id", table_name="referral_events", **DROP_OPTS
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_referral_events_referrer_user_id",
+            "referral_events",
+            ["referrer_user_id"],
+            **CREATE_OPTS,
+        )
+        op.drop_index(
+            "ix_referral_events_leaderboard", table_name="referral_events", **DROP_OPTS
+        )
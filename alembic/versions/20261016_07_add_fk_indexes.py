@@ -0,0 +1,28 @@
+"""Index foreign key columns that had no supporting index"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_07_add_fk_indexes"
+down_revision = "20261016_06_referral_referrer_status_index"
+branch_labels = None
+depends_on = None
+
+# См. 20261016_05: индексы на PostgreSQL строятся и удаляются CONCURRENTLY.
+CREATE_OPTS = {"postgresql_concurrently": True, "if_not_exists": True}
+DROP_OPTS = {"postgresql_concurrently": True, "if_exists": True}
+
+
+def upgrade() -> None:
+    # PostgreSQL не создаёт индексы на ссылающихся колонках сам: без них каскадное
+    # обновление subscription_plans.plan просматривает user_quotas целиком.
+    # referral_events.code_id уже проиндексирован в 20241214_03.
+    with op.get_context().autocommit_block():
+        op.create_index("ix_user_quotas_plan", "user_quotas", ["plan"], **CREATE_OPTS)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_user_quotas_plan", table_name="user_quotas", **DROP_OPTS)
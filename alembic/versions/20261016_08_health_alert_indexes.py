@@ -0,0 +1,39 @@
+"""Index health_alerts for open-alert lookups and the recent list"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_08_health_alert_indexes"
+down_revision = "20261016_07_add_fk_indexes"
+branch_labels = None
+depends_on = None
+
+# См. 20261016_05: индексы на PostgreSQL строятся и удаляются CONCURRENTLY.
+CREATE_OPTS = {"postgresql_concurrently": True, "if_not_exists": True}
+DROP_OPTS = {"postgresql_concurrently": True, "if_exists": True}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # record_alert/resolve_alert ищут открытый алерт по code и status, сортируя по created_at.
+        op.create_index(
+            "ix_health_alerts_code_status",
+            "health_alerts",
+            ["code", "status", "created_at"],
+            **CREATE_OPTS,
+        )
+        # recent_alerts читает последние записи по created_at.
+        op.create_index(
+            "ix_health_alerts_created_at", "health_alerts", ["created_at"], **CREATE_OPTS
+        )
+        # Ведущая колонка нового индекса заменяет одиночный индекс по code.
+        op.drop_index("ix_health_alerts_code", table_name="health_alerts", **DROP_OPTS)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_health_alerts_code", "health_alerts", ["code"], **CREATE_OPTS)
+        op.drop_index("ix_health_alerts_created_at", table_name="health_alerts", **DROP_OPTS)
+        op.drop_index("ix_health_alerts_code_status", table_name="health_alerts", **DROP_OPTS)
@@ -0,0 +1,33 @@
+"""Index referral_codes by (user_id, expires_at) for active-code lookups"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_09_referral_code_active_index"
+down_revision = "20261016_08_health_alert_indexes"
+branch_labels = None
+depends_on = None
+
+# См. 20261016_05: индексы на PostgreSQL строятся и удаляются CONCURRENTLY.
+CREATE_OPTS = {"postgresql_concurrently": True, "if_not_exists": True}
+DROP_OPTS = {"postgresql_concurrently": True, "if_exists": True}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_referral_codes_user_active",
+            "referral_codes",
+            ["user_id", "expires_at"],
+            **CREATE_OPTS,
+        )
+        # Ведущая колонка составного индекса обслуживает те же запросы, что и старый индекс.
+        op.drop_index("ix_referral_codes_user_id", table_name="referral_codes", **DROP_OPTS)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_referral_codes_user_id", "referral_codes", ["user_id"], **CREATE_OPTS)
+        op.drop_index("ix_referral_codes_user_active", table_name="referral_codes", **DROP_OPTS)
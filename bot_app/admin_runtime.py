@@ -2,12 +2,24 @@
 
 from __future__ import annotations
 
+import heapq
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import config
 from bot_app import state
-from bot_app.runtime import global_download_semaphore
+
+# Settings are fixed for the lifetime of the process; read them once.
+_STUCK_TIMEOUT_SECONDS = getattr(config, "DOWNLOAD_STUCK_TIMEOUT_SECONDS", 900)
+_MAX_GLOBAL_SLOTS = max(1, getattr(config, "MAX_GLOBAL_CONCURRENT_DOWNLOADS", 1))
+
+
+def _active_rank(row: Dict[str, Any]) -> Tuple[int, float]:
+    return row["active"], row["seconds_since_last"] or 0
+
+
+def _pending_issued_at(item: Tuple[str, state.PendingDownload]) -> float:
+    return item[1].ts
 
 
 def get_runtime_snapshot(
@@ -18,15 +30,13 @@ def get_runtime_snapshot(
 
     now = time.time()
     active_rows: List[Dict[str, Any]] = []
-    for user_id, active_count in state.user_active_downloads.items():
+    for user_id in state.active_user_ids:
+        active_count = state.user_active_downloads.get(user_id, 0)
         if active_count <= 0:
             continue
         last_activity = state.user_last_request_ts.get(user_id)
         since_last = (now - last_activity) if last_activity else None
-        stuck = bool(
-            since_last is not None
-            and since_last > getattr(config, "DOWNLOAD_STUCK_TIMEOUT_SECONDS", 900)
-        )
+        stuck = since_last is not None and since_last > _STUCK_TIMEOUT_SECONDS
         active_rows.append(
             {
                 "user_id": user_id,
@@ -36,33 +46,35 @@ def get_runtime_snapshot(
                 "is_stuck": stuck,
             }
         )
-    active_rows.sort(key=lambda row: (-row["active"], -(row["seconds_since_last"] or 0)))
+    # Only the top rows are shown, so select them without sorting everything.
     if active_limit > 0:
-        active_rows = active_rows[:active_limit]
+        active_rows = heapq.nlargest(active_limit, active_rows, key=_active_rank)
+    else:
+        active_rows.sort(key=_active_rank, reverse=True)
 
     pending_rows: List[Dict[str, Any]] = []
-    pending_items = sorted(
+    pending_items = heapq.nlargest(
+        pending_limit,
         state.pending_downloads.items(),
-        key=lambda item: float(item[1].get("ts", 0.0)),
-        reverse=True,
+        key=_pending_issued_at,
     )
-    for token, payload in pending_items[:pending_limit]:
-        issued_at = float(payload.get("ts", 0.0))
+    for token, payload in pending_items:
+        issued_at = payload.ts
         pending_rows.append(
             {
                 "token": token,
                 "age_seconds": max(0.0, now - issued_at) if issued_at else None,
-                "initiator_id": payload.get("initiator_id"),
-                "source_chat_id": payload.get("source_chat_id"),
+                "initiator_id": payload.initiator_id,
+                "source_chat_id": payload.source_chat_id,
             }
         )
 
-    max_slots = max(1, getattr(config, "MAX_GLOBAL_CONCURRENT_DOWNLOADS", 1))
-    available = getattr(global_download_semaphore, "_value", max_slots)
-    in_use = max(0, max_slots - available)
+    max_slots = _MAX_GLOBAL_SLOTS
+    in_use = state.global_slots_in_use
+    available = max(0, max_slots - in_use)
 
     return {
-        "active_total": sum(state.user_active_downloads.values()),
+        "active_total": state.total_active_downloads(),
         "active_rows": active_rows,
         "pending_total": len(state.pending_downloads),
         "pending_rows": pending_rows,
@@ -79,9 +91,11 @@ def get_runtime_snapshot(
 def cancel_user_downloads(user_id: int) -> bool:
     """Reset active counter for the given user if present."""
 
-    if user_id not in state.user_active_downloads:
+    # A single pop both checks and clears; release_user_slot() in the handlers'
+    # finally blocks treats the missing key as zero.
+    if state.user_active_downloads.pop(user_id, None) is None:
         return False
-    state.user_active_downloads[user_id] = 0
+    state.active_user_ids.discard(user_id)
     state.user_last_request_ts.pop(user_id, None)
     return True
 
@@ -95,9 +109,10 @@ def drop_pending_token(token: str) -> bool:
 def flush_pending_tokens() -> int:
     """Remove all pending tokens, returning the number of cleared entries."""
 
-    count = len(state.pending_downloads)
-    state.pending_downloads.clear()
-    return count
+    # Swap in a fresh dict instead of clearing in place; the old one is freed wholesale.
+    # Runs on the bot loop (see RuntimeController), so no other coroutine interleaves here.
+    dropped, state.pending_downloads = state.pending_downloads, {}
+    return len(dropped)
 
 
 __all__ = [
@@ -2,22 +2,24 @@
 
 from __future__ import annotations
 
+import asyncio
 import math
-import shutil
 import time
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
-from aiogram import types
+from aiogram import F, types
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import FSInputFile
 
 import config
+from db import upsert_chat
 from bot_app import quota as quota_ui
 from bot_app.referral import build_profile_view
 from bot_app.helpers import detect_platform, resolve_chat_title, resolve_user_display
-from bot_app.runtime import bot, dp, global_download_semaphore, logger
+from bot_app.runtime import bot, dp, global_download_semaphore, logger, send_with_upload_slot
+from bot_app.maintenance import record_download, schedule_tmpdir_cleanup
 from bot_app import state
 from bot_app.ui import status as status_ui
 from bot_app.ui.i18n import get_locale, translate
@@ -25,8 +27,8 @@ from monitoring import (
     add_breadcrumb,
     capture_exception,
     increment_metric,
+    record_metrics,
     request_context,
-    set_metric_gauge,
 )
 from bot_app.metrics import update_active_downloads_gauge, update_pending_tokens_gauge, update_queue_gauges
 from utils.access_control import is_user_allowed, get_access_denied_message, check_and_log_access
@@ -36,6 +38,15 @@ from utils.url_validation import ensure_safe_public_url, UnsafeURLError
 from services import quotas as quota_service
 from services import referrals as referral_service
 
+# Лимиты читаются из config один раз при импорте: обработчик кнопок вызывается на
+# каждое нажатие, а значения не меняются во время работы процесса.
+_CALLBACK_CHAT_COOLDOWN = getattr(config, "CALLBACK_CHAT_COOLDOWN_SECONDS", 0)
+_CALLBACK_GLOBAL_MAX_CALLS = getattr(config, "CALLBACK_GLOBAL_MAX_CALLS", 0)
+_CALLBACK_GLOBAL_WINDOW = getattr(config, "CALLBACK_GLOBAL_WINDOW_SECONDS", 60)
+_MAX_CONCURRENT_PER_USER = getattr(config, "MAX_CONCURRENT_PER_USER", 2)
+_USER_COOLDOWN_SECONDS = max(0, getattr(config, "USER_COOLDOWN_SECONDS", 5))
+_YTDLP_COOKIES_FILE = getattr(config, "YTDLP_COOKIES_FILE", None)
+
 
 async def _update_profile(callback: types.CallbackQuery, locale: str, section: str = "overview") -> None:
     if not callback.message:
@@ -47,7 +58,7 @@ async def _update_profile(callback: types.CallbackQuery, locale: str, section: s
         await callback.message.answer(text, reply_markup=markup)
 
 
-@dp.callback_query(lambda c: (c.data or "").startswith("referral:"))
+@dp.callback_query(F.data.startswith("referral:"))
 async def handle_referral_callback(callback: types.CallbackQuery):
     data = callback.data or ""
     parts = data.split(":", 2)
@@ -97,7 +108,7 @@ async def handle_referral_callback(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@dp.callback_query(lambda c: (c.data or "").startswith("profile:"))
+@dp.callback_query(F.data.startswith("profile:"))
 async def handle_profile_callback(callback: types.CallbackQuery):
     data = callback.data or ""
     locale = get_locale(getattr(callback.from_user, "language_code", None))
@@ -139,10 +150,21 @@ async def handle_profile_callback(callback: types.CallbackQuery):
 async def _safe_status_edit(status_msg: types.Message, text: str, **kwargs) -> None:
     if not status_msg:
         return
+    if not kwargs and state.status_text_unchanged(status_msg, text):
+        return
     try:
         await status_msg.edit_text(text, **kwargs)
     except Exception:
         logger.debug("Не удалось обновить статусное сообщение (callback)", exc_info=True)
+    else:
+        state.remember_status_text(status_msg, text)
+
+
+async def _safe_delete_prompt(message: types.Message) -> None:
+    try:
+        await message.delete()
+    except Exception:
+        logger.debug("Не удалось удалить сообщение с кнопкой (возможно нет прав).")
 
 
 async def _safe_delete_original_message(chat_id: int | None, message_id: int | None) -> None:
@@ -155,7 +177,7 @@ async def _safe_delete_original_message(chat_id: int | None, message_id: int | N
 
 
 def _consume_chat_rate_slot(chat_id: int | None, now: float) -> bool:
-    cooldown = getattr(config, "CALLBACK_CHAT_COOLDOWN_SECONDS", 0)
+    cooldown = _CALLBACK_CHAT_COOLDOWN
     if not chat_id or cooldown <= 0:
         return True
     last = state.chat_last_callback_ts.get(chat_id, 0.0)
@@ -166,25 +188,69 @@ def _consume_chat_rate_slot(chat_id: int | None, now: float) -> bool:
 
 
 def _consume_global_rate_slot(now: float) -> bool:
-    limit = getattr(config, "CALLBACK_GLOBAL_MAX_CALLS", 0)
-    window = getattr(config, "CALLBACK_GLOBAL_WINDOW_SECONDS", 60)
+    limit = _CALLBACK_GLOBAL_MAX_CALLS
+    window = _CALLBACK_GLOBAL_WINDOW
     if limit <= 0 or window <= 0:
         return True
-    events = state.global_callback_events
-    while events and now - events[0] > window:
-        events.popleft()
-    if len(events) >= limit:
+    # Бакет вмещает limit токенов и пополняется со скоростью limit/window в секунду:
+    # вместо очереди отметок времени — одно число и время пополнения.
+    # Отметка пополнения не откатывается назад: вызов с более ранним now (обработчики
+    # чередуются на await) не должен ни уводить запас в минус, ни засчитывать
+    # один и тот же интервал дважды.
+    last = state.global_rate_last_refill
+    if last <= 0:
+        tokens = float(limit)
+        state.global_rate_last_refill = now
+    else:
+        elapsed = max(0.0, now - last)
+        tokens = min(float(limit), state.global_rate_tokens + elapsed * limit / window)
+        state.global_rate_last_refill = max(last, now)
+    if tokens < 1:
+        state.global_rate_tokens = tokens
         return False
-    events.append(now)
+    state.global_rate_tokens = tokens - 1
     return True
 
 
-@dp.callback_query(lambda c: (c.data or "").startswith("download:"))
+def _admit_callback(uid: int, chat_id: int | None, locale: str) -> Optional[str]:
+    """Apply rate, concurrency and cooldown limits; reserve a slot or return the refusal text.
+
+    Функция синхронная: между проверкой active и резервированием слота нет await,
+    поэтому два одновременных нажатия не проходят лимит оба.
+    """
+    # Лимитеры нажатий живут только здесь — монотонные часы не прыгают при
+    # коррекции системного времени. Кулдаун делит user_last_request_ts с
+    # админкой и очисткой, поэтому остаётся на time.time().
+    tick = time.monotonic()
+    if not _consume_chat_rate_slot(chat_id, tick):
+        return translate("download.chat_rate_limited", locale)
+    if not _consume_global_rate_slot(tick):
+        return translate("download.global_rate_limited", locale)
+
+    active = state.user_active_downloads.get(uid, 0)
+    limit = _MAX_CONCURRENT_PER_USER
+    if active >= limit:
+        return translate("download.active_limit", locale, active=active, limit=limit)
+
+    now = time.time()
+    cooldown = _USER_COOLDOWN_SECONDS
+    last_ts = state.user_last_request_ts.get(uid, 0.0)
+    if cooldown and last_ts and now - last_ts < cooldown:
+        wait = max(1, math.ceil(cooldown - (now - last_ts)))
+        return translate("download.cooldown", locale, seconds=wait)
+
+    state.user_last_request_ts[uid] = now
+    state.reserve_user_slot(uid)
+    return None
+
+
+@dp.callback_query(F.data.startswith("download:"))
 async def handle_download_callback(callback: types.CallbackQuery):
     """Handle inline Download button clicks (callback_data: download:<token>)."""
     logger.info("Received callback_query: %s from %s", callback.data, getattr(callback.from_user, "id", None))
     data = callback.data or ""
     token = data.split(":", 1)[1]
+    now = time.time()
     entry = state.pending_downloads.pop(token, None)
     update_pending_tokens_gauge()
     locale = get_locale(getattr(callback.from_user, "language_code", None))
@@ -192,18 +258,17 @@ async def handle_download_callback(callback: types.CallbackQuery):
         await callback.answer(translate("download.pending_missing", locale), show_alert=True)
         return
 
-    if time.time() - entry.get("ts", 0) > state.PENDING_TOKEN_TTL:
+    if now - entry.ts > state.PENDING_TOKEN_TTL:
         await callback.answer(translate("download.pending_expired", locale), show_alert=True)
         return
 
-    url = entry.get("url")
+    url = entry.url
     uid = callback.from_user.id
     username = resolve_user_display(callback.from_user)
-    initiator_id = entry.get("initiator_id")
-    source_chat_id = entry.get("source_chat_id")
-    source_message_id = entry.get("source_message_id")
+    initiator_id = entry.initiator_id
+    source_chat_id = entry.source_chat_id
+    source_message_id = entry.source_message_id
     process_started = time.perf_counter()
-    request_id = uuid4().hex
     message_chat = getattr(callback, "message", None)
     tg_chat = getattr(message_chat, "chat", None)
     chat_id = getattr(tg_chat, "id", None)
@@ -211,11 +276,10 @@ async def handle_download_callback(callback: types.CallbackQuery):
     tmpdir: Optional[Path] = None
     status_msg: Optional[types.Message] = None
     active_slot_acquired = False
+    outcome_metric: Optional[str] = None
 
     if config.ENABLE_HISTORY and getattr(callback, "message", None):
         try:
-            from db import upsert_chat
-
             upsert_chat(
                 chat_id=callback.message.chat.id,
                 title=resolve_chat_title(callback.message.chat),
@@ -224,6 +288,8 @@ async def handle_download_callback(callback: types.CallbackQuery):
         except Exception:
             logger.debug("Не удалось обновить сведения о чате (callback)", exc_info=True)
 
+    # Один uuid4 на запрос: он же служит суффиксом временного каталога.
+    request_id = uuid4().hex
     with request_context(
         request_id=request_id,
         user_id=uid,
@@ -259,59 +325,27 @@ async def handle_download_callback(callback: types.CallbackQuery):
             quota_plan = None
             if config.ENABLE_HISTORY:
                 try:
-                    quota_plan = quota_service.build_enforcement_plan(uid)
+                    quota_plan = quota_service.cached_enforcement_plan(uid)
                 except Exception:
                     logger.debug("Не удалось получить данные квот (callback)", exc_info=True)
             if quota_plan and quota_plan.get("blocked"):
                 await callback.answer(quota_ui.quota_block_message(quota_plan, locale), show_alert=True)
                 return
 
-            now = time.time()
-            if not _consume_chat_rate_slot(chat_id, now):
-                await callback.answer(
-                    translate("download.chat_rate_limited", locale),
-                    show_alert=True,
-                )
-                return
-            if not _consume_global_rate_slot(now):
-                await callback.answer(
-                    translate("download.global_rate_limited", locale),
-                    show_alert=True,
-                )
+            rejection = _admit_callback(uid, chat_id, locale)
+            if rejection:
+                await callback.answer(rejection, show_alert=True)
                 return
-
-            active = state.user_active_downloads.get(uid, 0)
-            max_per_user = getattr(config, "MAX_CONCURRENT_PER_USER", 2)
-            if active >= max_per_user:
-                await callback.answer(
-                    translate("download.active_limit", locale, active=active, limit=max_per_user),
-                    show_alert=True,
-                )
-                return
-
-            cooldown = max(0, getattr(config, "USER_COOLDOWN_SECONDS", 5))
-            last_ts = state.user_last_request_ts.get(uid, 0.0)
-            if cooldown and last_ts:
-                elapsed = now - last_ts
-                if elapsed < cooldown:
-                    wait = max(1, math.ceil(cooldown - elapsed))
-                    await callback.answer(
-                        translate("download.cooldown", locale, seconds=wait),
-                        show_alert=True,
-                    )
-                    return
+            active_slot_acquired = True
+            update_active_downloads_gauge()
 
             try:
                 await callback.answer(translate("download.starting", locale))
             except Exception:
                 pass
 
-            state.user_last_request_ts[uid] = now
-            state.user_active_downloads[uid] = active + 1
-            active_slot_acquired = True
-            update_active_downloads_gauge()
-
-            platform = detect_platform(url)
+            # Платформа уже определена при публикации ссылки.
+            platform = entry.platform or detect_platform(url)
             ctx["platform"] = platform
             if not platform:
                 increment_metric("downloads.unsupported")
@@ -326,14 +360,14 @@ async def handle_download_callback(callback: types.CallbackQuery):
                 status_ui.waiting(
                     platform,
                     state.user_active_downloads.get(uid, 0),
-                    max_per_user,
+                    _MAX_CONCURRENT_PER_USER,
                     locale=locale,
                 )
             )
-            tmpdir = Path(config.TEMP_DIR) / f"{uid}_{token[:8]}_{uuid4().hex[:6]}"
+            tmpdir = config.TEMP_DIR / f"{uid}_{token[:8]}_{request_id[:6]}"
             tmpdir.mkdir(parents=True, exist_ok=True)
 
-            cookies_file = getattr(config, "YTDLP_COOKIES_FILE", None)
+            cookies_file = _YTDLP_COOKIES_FILE
             logger.info("Waiting for global download slot (callback)...")
             await _safe_status_edit(status_msg, status_ui.downloading(platform, locale=locale))
             progress_callback = None
@@ -344,11 +378,12 @@ async def handle_download_callback(callback: types.CallbackQuery):
                     locale=locale,
                 )
             wait_started = time.perf_counter()
-            async with global_download_semaphore:
+            async with state.slot_usage(global_download_semaphore):
                 wait_ms = int((time.perf_counter() - wait_started) * 1000)
-                increment_metric("downloads.wait_time_ms_total", wait_ms)
-                increment_metric("downloads.wait_time_events")
-                set_metric_gauge("downloads.wait_last_ms", wait_ms)
+                record_metrics(
+                    {"downloads.wait_time_ms_total": wait_ms, "downloads.wait_time_events": 1},
+                    {"downloads.wait_last_ms": wait_ms},
+                )
                 update_queue_gauges()
                 logger.info("Acquired global download slot (callback)")
                 downloaded_path = await download_video(
@@ -360,13 +395,13 @@ async def handle_download_callback(callback: types.CallbackQuery):
                 )
             logger.info("Released global download slot (callback)")
             update_queue_gauges()
-            await ensure_file_is_safe(downloaded_path)
-            await _safe_status_edit(status_msg, status_ui.processing(platform, locale=locale))
-
-            size = downloaded_path.stat().st_size
+            # Размер проверяем до сканера: слишком большой файл всё равно не отправить.
+            size = (await asyncio.to_thread(downloaded_path.stat)).st_size
             if size > config.TELEGRAM_MAX_FILE_BYTES:
                 await _safe_status_edit(status_msg, translate("download.large_file_limit", locale))
                 return
+            await ensure_file_is_safe(downloaded_path)
+            await _safe_status_edit(status_msg, status_ui.processing(platform, locale=locale))
 
             is_photo = is_image_file(downloaded_path)
             caption_key = "download.caption.photo" if is_photo else "download.caption.video"
@@ -375,17 +410,21 @@ async def handle_download_callback(callback: types.CallbackQuery):
             )
             caption = translate(caption_key, locale, platform=platform_label)
             doc_caption = translate(doc_caption_key, locale, platform=platform_label)
+            # FSInputFile открывает файл заново при каждой отправке,
+            # поэтому один объект годится и для фолбэка в документ.
+            file_obj = FSInputFile(path=downloaded_path, filename=downloaded_path.name)
             try:
                 await _safe_status_edit(status_msg, status_ui.sending(platform, locale=locale))
-                file_obj = FSInputFile(path=str(downloaded_path))
                 if is_photo:
-                    await bot.send_photo(
+                    await send_with_upload_slot(
+                        bot.send_photo,
                         chat_id=callback.message.chat.id,
                         photo=file_obj,
                         caption=caption,
                     )
                 else:
-                    await bot.send_video(
+                    await send_with_upload_slot(
+                        bot.send_video,
                         chat_id=callback.message.chat.id,
                         video=file_obj,
                         caption=caption,
@@ -400,8 +439,8 @@ async def handle_download_callback(callback: types.CallbackQuery):
                     pass
                 try:
                     await _safe_status_edit(status_msg, status_ui.sending(platform, locale=locale))
-                    file_obj = FSInputFile(path=str(downloaded_path))
-                    await bot.send_document(
+                    await send_with_upload_slot(
+                        bot.send_document,
                         chat_id=callback.message.chat.id,
                         document=file_obj,
                         caption=doc_caption,
@@ -418,26 +457,23 @@ async def handle_download_callback(callback: types.CallbackQuery):
                     )
                     return
 
-            try:
-                await callback.message.delete()
-            except Exception:
-                logger.debug("Не удалось удалить сообщение с кнопкой (возможно нет прав).")
-
-            await _safe_status_edit(
-                status_msg,
-                status_ui.success(platform, locale=locale),
-                reply_markup=status_ui.success_markup(url, locale=locale),
+            # Запросы к Telegram после отправки независимы и не бросают исключений.
+            await asyncio.gather(
+                _safe_delete_prompt(callback.message),
+                _safe_status_edit(
+                    status_msg,
+                    status_ui.success(platform, locale=locale),
+                    reply_markup=status_ui.success_markup(url, locale=locale),
+                ),
+                _safe_delete_original_message(source_chat_id, source_message_id),
             )
-            await _safe_delete_original_message(source_chat_id, source_message_id)
 
-            increment_metric("downloads.success")
+            outcome_metric = "downloads.success"
             add_breadcrumb("callback.success", platform=platform, size=size)
 
             if config.ENABLE_HISTORY:
                 try:
-                    from db import add_download
-
-                    add_download(
+                    record_download(
                         user_id=uid,
                         username=username,
                         platform=platform,
@@ -453,20 +489,8 @@ async def handle_download_callback(callback: types.CallbackQuery):
                 except Exception as log_err:
                     logger.debug("Failed to log success to DB: %s", log_err)
 
-        except DownloadError as e:
-            increment_metric("downloads.failure")
-            await _log_and_report_callback_error(
-                callback,
-                status_msg,
-                e,
-                url,
-                uid,
-                username,
-                ctx.get("platform"),
-                locale,
-            )
         except Exception as e:
-            increment_metric("downloads.failure")
+            outcome_metric = "downloads.failure"
             await _log_and_report_callback_error(
                 callback,
                 status_msg,
@@ -479,13 +503,17 @@ async def handle_download_callback(callback: types.CallbackQuery):
             )
         finally:
             duration_ms = int((time.perf_counter() - process_started) * 1000)
-            increment_metric("downloads.duration_ms_total", duration_ms)
-            increment_metric("downloads.duration_events")
+            # Итоговые счётчики и gauge активных загрузок пишутся в реестр одним вызовом.
+            counters = {"downloads.duration_ms_total": duration_ms, "downloads.duration_events": 1}
+            if outcome_metric:
+                counters[outcome_metric] = 1
+            gauges = {}
             if active_slot_acquired:
-                state.user_active_downloads[uid] = max(0, state.user_active_downloads.get(uid, 0) - 1)
-                update_active_downloads_gauge()
+                state.release_user_slot(uid)
+                gauges["downloads.active"] = state.total_active_downloads()
+            record_metrics(counters, gauges)
             if tmpdir:
-                shutil.rmtree(tmpdir, ignore_errors=True)
+                schedule_tmpdir_cleanup(tmpdir)
 
 
 async def _log_and_report_callback_error(
@@ -498,16 +526,18 @@ async def _log_and_report_callback_error(
     platform: str | None,
     locale: str,
 ):
-    logger.exception("Ошибка при обработке callback: %s", error)
+    if isinstance(error, DownloadError):
+        # Ожидаемая ошибка загрузки: причина уже в тексте, трейсбек не нужен.
+        logger.warning("Ошибка загрузки (callback): %s", error)
+    else:
+        logger.exception("Ошибка при обработке callback: %s", error)
     try:
         capture_exception(error)
     except Exception:
         pass
     if config.ENABLE_HISTORY:
         try:
-            from db import add_download
-
-            add_download(
+            record_download(
                 user_id=uid,
                 username=username,
                 platform=platform,
@@ -2,8 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
 import math
-import shutil
 import time
 from pathlib import Path
 from typing import Optional
@@ -15,6 +15,7 @@ from aiogram.filters import Command
 from aiogram.types import FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
 
 import config
+from db import upsert_chat
 from bot_app import quota as quota_ui
 from bot_app import state
 from bot_app.helpers import (
@@ -25,7 +26,8 @@ from bot_app.helpers import (
     resolve_user_display,
 )
 from bot_app.metrics import update_active_downloads_gauge, update_pending_tokens_gauge, update_queue_gauges
-from bot_app.runtime import bot, dp, global_download_semaphore, logger
+from bot_app.runtime import bot, dp, global_download_semaphore, logger, send_with_upload_slot
+from bot_app.maintenance import record_download, schedule_tmpdir_cleanup
 from bot_app.ui import status as status_ui
 from bot_app.ui.i18n import get_locale, translate
 from monitoring import add_breadcrumb, capture_exception, increment_metric, request_context, set_metric_gauge
@@ -35,6 +37,26 @@ from utils.access_control import check_and_log_access, get_access_denied_message
 from utils.downloader import DownloadError, download_video, is_image_file
 from utils.url_validation import UnsafeURLError, ensure_safe_public_url
 
+_MAX_CONCURRENT_PER_USER = getattr(config, "MAX_CONCURRENT_PER_USER", 2)
+_USER_COOLDOWN_SECONDS = max(0, getattr(config, "USER_COOLDOWN_SECONDS", 5))
+_YTDLP_COOKIES_FILE = getattr(config, "YTDLP_COOKIES_FILE", None)
+
+
+_URL_ENTITY_TYPES = frozenset({"url", "text_link"})
+
+
+def _might_contain_url(message: types.Message) -> bool:
+    """Filter out commands and chit-chat without links before the handler runs."""
+
+    text = message.text or message.caption or ""
+    if text.lstrip().startswith("/"):
+        return False
+    for entities in (message.entities, message.caption_entities):
+        if entities and any(ent.type in _URL_ENTITY_TYPES for ent in entities):
+            return True
+    # Запасной путь для ссылок без сущностей, как в extract_first_url_from_text.
+    return "://" in text
+
 
 def _choose_text_source(message: types.Message) -> str:
     """Return preferred textual payload for URL parsing."""
@@ -45,10 +67,14 @@ def _choose_text_source(message: types.Message) -> str:
 async def _safe_status_edit(status_msg: types.Message, text: str, **kwargs) -> None:
     if not status_msg:
         return
+    if not kwargs and state.status_text_unchanged(status_msg, text):
+        return
     try:
         await status_msg.edit_text(text, **kwargs)
     except Exception:
         logger.debug("Не удалось обновить статусное сообщение", exc_info=True)
+    else:
+        state.remember_status_text(status_msg, text)
 
 
 async def _safe_delete_message(message: types.Message) -> None:
@@ -65,6 +91,42 @@ async def _safe_delete_message(message: types.Message) -> None:
         logger.debug("Не удалось удалить сообщение пользователя", exc_info=True)
 
 
+async def _report_download_failure(
+    message: types.Message,
+    status_msg: Optional[types.Message],
+    error: Exception,
+    *,
+    url: str,
+    uid: int,
+    username: Optional[str],
+    platform: Optional[str],
+    locale: str,
+) -> None:
+    if isinstance(error, DownloadError):
+        # Ожидаемая ошибка загрузки: причина уже в тексте, трейсбек не нужен.
+        logger.warning("DownloadError: %s", error)
+    else:
+        logger.exception("Непредвиданная ошибка", exc_info=error)
+    try:
+        capture_exception(error)
+    except Exception:
+        pass
+    await _safe_status_edit(status_msg, status_ui.error(str(error), locale=locale))
+    if config.ENABLE_HISTORY:
+        try:
+            record_download(
+                user_id=uid,
+                username=username,
+                platform=platform,
+                url=url,
+                chat_id=message.chat.id,
+                status="error",
+                error_message=str(error),
+            )
+        except Exception:
+            logger.debug("Ошибка при логировании ошибки в БД")
+
+
 @dp.message(Command("download"))
 async def download_command_handler(message: types.Message):
     """Handle /download commands (optionally replying to a message)."""
@@ -85,7 +147,7 @@ async def download_command_handler(message: types.Message):
     await _process_download_flow(message, url, locale)
 
 
-@dp.message(lambda message: not ((message.text or message.caption or "").strip().startswith("/")))
+@dp.message(_might_contain_url)
 async def universal_handler(message: types.Message):
     """Entry point for all download requests that are not commands."""
 
@@ -149,8 +211,6 @@ async def _process_download_flow(
 
             if config.ENABLE_HISTORY:
                 try:
-                    from db import upsert_chat
-
                     upsert_chat(
                         chat_id=chat_id,
                         title=resolve_chat_title(message.chat),
@@ -173,7 +233,7 @@ async def _process_download_flow(
             quota_plan = None
             if config.ENABLE_HISTORY:
                 try:
-                    quota_plan = quota_service.build_enforcement_plan(uid)
+                    quota_plan = quota_service.cached_enforcement_plan(uid)
                 except Exception:
                     logger.debug("Не удалось получить данные квот", exc_info=True)
             if quota_plan and quota_plan.get("blocked"):
@@ -183,7 +243,7 @@ async def _process_download_flow(
                 await message.reply(block_text)
                 return
 
-            max_per_user = getattr(config, "MAX_CONCURRENT_PER_USER", 2)
+            max_per_user = _MAX_CONCURRENT_PER_USER
             active = state.user_active_downloads.get(uid, 0)
             if active >= max_per_user and chat_type not in ("group", "supergroup"):
                 await message.reply(
@@ -191,7 +251,7 @@ async def _process_download_flow(
                 )
                 return
 
-            cooldown = max(0, getattr(config, "USER_COOLDOWN_SECONDS", 5))
+            cooldown = _USER_COOLDOWN_SECONDS
             now = time.time()
             last_ts = state.user_last_request_ts.get(uid, 0.0)
             if cooldown and last_ts:
@@ -203,13 +263,17 @@ async def _process_download_flow(
 
             if chat_type in ("group", "supergroup"):
                 token = uuid4().hex
-                state.pending_downloads[token] = {
-                    "url": url,
-                    "initiator_id": uid,
-                    "ts": time.time(),
-                    "source_chat_id": chat_id,
-                    "source_message_id": getattr(message, "message_id", None),
-                }
+                state.add_pending_download(
+                    token,
+                    state.PendingDownload(
+                        ts=time.time(),
+                        url=url,
+                        initiator_id=uid,
+                        source_chat_id=chat_id,
+                        source_message_id=getattr(message, "message_id", None),
+                        platform=platform,
+                    ),
+                )
                 update_pending_tokens_gauge()
                 kb = InlineKeyboardMarkup(
                     inline_keyboard=[
@@ -232,23 +296,23 @@ async def _process_download_flow(
                 return
 
             state.user_last_request_ts[uid] = now
-            state.user_active_downloads[uid] = active + 1
+            active = state.reserve_user_slot(uid)
             active_slot_acquired = True
             update_active_downloads_gauge()
 
             status_msg = await message.reply(
                 status_ui.waiting(
                     platform,
-                    state.user_active_downloads.get(uid, 0),
+                    active,
                     max_per_user,
                     locale=locale,
                 )
             )
 
-            tmpdir = Path(config.TEMP_DIR) / f"{uid}_{uuid4().hex[:12]}"
+            tmpdir = config.TEMP_DIR / f"{uid}_{uuid4().hex[:12]}"
             tmpdir.mkdir(parents=True, exist_ok=True)
 
-            cookies_file = getattr(config, "YTDLP_COOKIES_FILE", None)
+            cookies_file = _YTDLP_COOKIES_FILE
             logger.info("Waiting for global download slot...")
             await _safe_status_edit(status_msg, status_ui.downloading(platform, locale=locale))
             progress_callback = None
@@ -259,7 +323,7 @@ async def _process_download_flow(
                     locale=locale,
                 )
             wait_started = time.perf_counter()
-            async with global_download_semaphore:
+            async with state.slot_usage(global_download_semaphore):
                 wait_ms = int((time.perf_counter() - wait_started) * 1000)
                 increment_metric("downloads.wait_time_ms_total", wait_ms)
                 increment_metric("downloads.wait_time_events")
@@ -275,13 +339,13 @@ async def _process_download_flow(
                 )
             logger.info("Released global download slot")
             update_queue_gauges()
-            await ensure_file_is_safe(downloaded_path)
-            await _safe_status_edit(status_msg, status_ui.processing(platform, locale=locale))
-
-            size = downloaded_path.stat().st_size
+            # Размер проверяем до сканера: слишком большой файл всё равно не отправить.
+            size = (await asyncio.to_thread(downloaded_path.stat)).st_size
             if size > config.TELEGRAM_MAX_FILE_BYTES:
                 await _safe_status_edit(status_msg, translate("download.large_file_limit", locale))
                 return
+            await ensure_file_is_safe(downloaded_path)
+            await _safe_status_edit(status_msg, status_ui.processing(platform, locale=locale))
 
             is_photo = is_image_file(downloaded_path)
             caption_key = "download.caption.photo" if is_photo else "download.caption.video"
@@ -290,17 +354,21 @@ async def _process_download_flow(
             )
             caption = translate(caption_key, locale, platform=platform_label)
             doc_caption = translate(doc_caption_key, locale, platform=platform_label)
+            # FSInputFile открывает файл заново при каждой отправке,
+            # поэтому один объект годится и для фолбэка в документ.
+            file_obj = FSInputFile(path=downloaded_path, filename=downloaded_path.name)
             try:
                 await _safe_status_edit(status_msg, status_ui.sending(platform, locale=locale))
-                file_obj = FSInputFile(path=str(downloaded_path))
                 if is_photo:
-                    await bot.send_photo(
+                    await send_with_upload_slot(
+                        bot.send_photo,
                         chat_id=message.chat.id,
                         photo=file_obj,
                         caption=caption,
                     )
                 else:
-                    await bot.send_video(
+                    await send_with_upload_slot(
+                        bot.send_video,
                         chat_id=message.chat.id,
                         video=file_obj,
                         caption=caption,
@@ -315,8 +383,8 @@ async def _process_download_flow(
                     pass
                 try:
                     await _safe_status_edit(status_msg, status_ui.sending(platform, locale=locale))
-                    file_obj = FSInputFile(path=str(downloaded_path))
-                    await bot.send_document(
+                    await send_with_upload_slot(
+                        bot.send_document,
                         chat_id=message.chat.id,
                         document=file_obj,
                         caption=doc_caption,
@@ -333,20 +401,21 @@ async def _process_download_flow(
                     )
                     return
 
-            await _safe_status_edit(
-                status_msg,
-                status_ui.success(platform, locale=locale),
-                reply_markup=status_ui.success_markup(url, locale=locale),
+            # Запросы к Telegram после отправки независимы и не бросают исключений.
+            await asyncio.gather(
+                _safe_status_edit(
+                    status_msg,
+                    status_ui.success(platform, locale=locale),
+                    reply_markup=status_ui.success_markup(url, locale=locale),
+                ),
+                _safe_delete_message(message),
             )
-            await _safe_delete_message(message)
             increment_metric("downloads.success")
             add_breadcrumb("download.success", size=size, platform=platform)
 
             if config.ENABLE_HISTORY:
                 try:
-                    from db import add_download  # local import to avoid cycles
-
-                    add_download(
+                    record_download(
                         user_id=uid,
                         username=user_display,
                         platform=platform,
@@ -362,58 +431,24 @@ async def _process_download_flow(
                 except Exception as e:
                     logger.debug("Ошибка при логировании в БД: %s", e)
 
-        except DownloadError as e:
-            increment_metric("downloads.failure")
-            logger.exception("DownloadError: %s", e)
-            try:
-                capture_exception(e)
-            except Exception:
-                pass
-            await _safe_status_edit(status_msg, status_ui.error(str(e), locale=locale))
-            if config.ENABLE_HISTORY:
-                try:
-                    from db import add_download
-
-                    add_download(
-                        user_id=uid,
-                        username=user_display,
-                        platform=ctx.get("platform"),
-                        url=url,
-                        chat_id=message.chat.id,
-                        status="error",
-                        error_message=str(e),
-                    )
-                except Exception:
-                    logger.debug("Ошибка при логировании ошибки в БД")
         except Exception as e:
             increment_metric("downloads.failure")
-            logger.exception("Непредвиданная ошибка", exc_info=e)
-            try:
-                capture_exception(e)
-            except Exception:
-                pass
-            await _safe_status_edit(status_msg, status_ui.error(str(e), locale=locale))
-            if config.ENABLE_HISTORY:
-                try:
-                    from db import add_download
-
-                    add_download(
-                        user_id=uid,
-                        username=user_display,
-                        platform=ctx.get("platform"),
-                        url=url,
-                        chat_id=message.chat.id,
-                        status="error",
-                        error_message=str(e),
-                    )
-                except Exception:
-                    logger.debug("Ошибка при логировании в БД")
+            await _report_download_failure(
+                message,
+                status_msg,
+                e,
+                url=url,
+                uid=uid,
+                username=user_display,
+                platform=ctx.get("platform"),
+                locale=locale,
+            )
         finally:
             duration_ms = int((time.perf_counter() - process_started) * 1000)
             increment_metric("downloads.duration_ms_total", duration_ms)
             increment_metric("downloads.duration_events")
             if active_slot_acquired:
-                state.user_active_downloads[uid] = max(0, state.user_active_downloads.get(uid, 0) - 1)
+                state.release_user_slot(uid)
                 update_active_downloads_gauge()
             if tmpdir:
-                shutil.rmtree(tmpdir, ignore_errors=True)
+                schedule_tmpdir_cleanup(tmpdir)
@@ -4,61 +4,132 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import shutil
 import time
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import config
 from bot_app import state
+from db import add_downloads
 from services import health_monitor
+from services import stats as stats_service
 
 logger = logging.getLogger(__name__)
 
 _cleanup_task: Optional[asyncio.Task[None]] = None
 _cookie_task: Optional[asyncio.Task[None]] = None
 _health_task: Optional[asyncio.Task[None]] = None
+# Фоновые удаления временных каталогов загрузок; при остановке бота их дожидаемся.
+_tmpdir_cleanups: Set[asyncio.Task[None]] = set()
+# История загрузок пишется пачками: одна транзакция на HISTORY_BATCH_SIZE записей.
+HISTORY_BATCH_SIZE = 32
+HISTORY_FLUSH_DELAY = 0.05
+_history_queue: Optional[asyncio.Queue[Optional[Dict[str, Any]]]] = None
+_history_task: Optional[asyncio.Task[None]] = None
+
+
+def schedule_tmpdir_cleanup(path: Path) -> None:
+    """Remove a download temp dir in a worker thread without blocking the event loop."""
+    task = asyncio.get_running_loop().create_task(
+        asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+    )
+    _tmpdir_cleanups.add(task)
+    task.add_done_callback(_tmpdir_cleanups.discard)
+
+
+async def wait_tmpdir_cleanups() -> None:
+    """Wait for scheduled temp dir removals to finish."""
+    if _tmpdir_cleanups:
+        await asyncio.gather(*_tmpdir_cleanups, return_exceptions=True)
+
+
+def record_download(**fields: Any) -> None:
+    """Queue a download history row (``db.add_download`` kwargs) for the batch writer."""
+    if _history_queue is None:
+        # Писатель не запущен (скрипты, тесты) — пишем сразу.
+        add_downloads([fields])
+        stats_service.invalidate_stats_cache(fields.get("chat_id"))
+        return
+    _history_queue.put_nowait(fields)
+
+
+async def _write_history_batch(batch: List[Dict[str, Any]]) -> None:
+    await asyncio.to_thread(add_downloads, batch)
+    for chat_id in {record.get("chat_id") for record in batch}:
+        stats_service.invalidate_stats_cache(chat_id)
+
+
+async def _history_writer_loop(queue: asyncio.Queue[Optional[Dict[str, Any]]]) -> None:
+    while True:
+        record = await queue.get()
+        if record is None:
+            return
+        if queue.qsize() < HISTORY_BATCH_SIZE - 1:
+            # Даём соседним загрузкам попасть в ту же транзакцию.
+            await asyncio.sleep(HISTORY_FLUSH_DELAY)
+        batch = [record]
+        stop = False
+        while len(batch) < HISTORY_BATCH_SIZE and not queue.empty():
+            item = queue.get_nowait()
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        try:
+            await _write_history_batch(batch)
+        except Exception:
+            logger.exception("History writer failed to store %s records", len(batch))
+        if stop:
+            return
 
 
 def _purge_pending(now: float) -> int:
     """Drop expired pending download tokens."""
     ttl = state.PENDING_TOKEN_TTL
     removed = 0
-    for token, payload in list(state.pending_downloads.items()):
-        issued_at = float(payload.get("ts", 0))
-        if now - issued_at > ttl:
-            state.pending_downloads.pop(token, None)
-            removed += 1
+    pending = state.pending_downloads
+    # Токены лежат в порядке выдачи: останавливаемся на первом живом.
+    while pending:
+        token = next(iter(pending))
+        if now - pending[token].ts <= ttl:
+            break
+        del pending[token]
+        removed += 1
     return removed
 
 
-def _purge_stuck_actives(now: float, stuck_timeout: float, last_ttl: float) -> int:
-    """Reset counters for users whose activity should have completed by now."""
-    cleared = 0
-    for uid, active in list(state.user_active_downloads.items()):
-        last_ts = state.user_last_request_ts.get(uid, 0.0)
-        if active <= 0 and (now - last_ts) > last_ttl:
-            state.user_active_downloads.pop(uid, None)
-            cleared += 1
-            continue
-        if active > 0 and (now - last_ts) > stuck_timeout:
-            logger.warning(
-                "Resetting stuck active_downloads=%s for uid=%s (last activity %.0fs ago)",
-                active,
-                uid,
-                now - last_ts,
-            )
-            state.user_active_downloads[uid] = 0
-            cleared += 1
-    return cleared
-
-
-def _purge_stale_last_requests(now: float, last_ttl: float) -> int:
-    """Remove idle entries from the last-request map."""
-    removed = 0
-    for uid, ts in list(state.user_last_request_ts.items()):
-        if now - ts > last_ttl and state.user_active_downloads.get(uid, 0) <= 0:
-            state.user_last_request_ts.pop(uid, None)
-            removed += 1
-    return removed
+def _purge_user_state(now: float, stuck_timeout: float, last_ttl: float) -> Tuple[int, int]:
+    """Reset stuck counters and drop idle per-user entries in a single pass."""
+    active_map = state.user_active_downloads
+    last_map = state.user_last_request_ts
+    cleared_actives = 0
+    cleared_last = 0
+    for uid in list(active_map.keys() | last_map.keys()):
+        active = active_map.get(uid)
+        last_ts = last_map.get(uid)
+        idle = now - (last_ts or 0.0)
+        if active is not None:
+            if active <= 0 and idle > last_ttl:
+                active_map.pop(uid, None)
+                state.active_user_ids.discard(uid)
+                cleared_actives += 1
+                active = None
+            elif active > 0 and idle > stuck_timeout:
+                logger.warning(
+                    "Resetting stuck active_downloads=%s for uid=%s (last activity %.0fs ago)",
+                    active,
+                    uid,
+                    idle,
+                )
+                active_map[uid] = 0
+                state.active_user_ids.discard(uid)
+                cleared_actives += 1
+                active = 0
+        if last_ts is not None and idle > last_ttl and (active or 0) <= 0:
+            last_map.pop(uid, None)
+            cleared_last += 1
+    return cleared_actives, cleared_last
 
 
 async def _cleanup_loop() -> None:
@@ -76,8 +147,7 @@ async def _cleanup_loop() -> None:
             await asyncio.sleep(interval)
             now = time.time()
             removed_tokens = _purge_pending(now)
-            cleared_actives = _purge_stuck_actives(now, stuck_timeout, last_ttl)
-            cleared_last = _purge_stale_last_requests(now, last_ttl)
+            cleared_actives, cleared_last = _purge_user_state(now, stuck_timeout, last_ttl)
             if removed_tokens or cleared_actives or cleared_last:
                 logger.debug(
                     "Cleanup stats: removed_tokens=%s cleared_actives=%s cleared_last_ts=%s",
@@ -118,8 +188,13 @@ async def _cookie_refresh_loop() -> None:
 
 def start_background_tasks() -> None:
     """Ensure cleanup loop is running."""
-    global _cleanup_task, _cookie_task, _health_task
+    global _cleanup_task, _cookie_task, _health_task, _history_queue, _history_task
     loop = asyncio.get_running_loop()
+    if config.ENABLE_HISTORY and (not _history_task or _history_task.done()):
+        _history_queue = asyncio.Queue()
+        _history_task = loop.create_task(
+            _history_writer_loop(_history_queue), name="download-history-writer"
+        )
     if not _cleanup_task or _cleanup_task.done():
         _cleanup_task = loop.create_task(_cleanup_loop(), name="state-cleanup")
     if not _cookie_task or _cookie_task.done():
@@ -130,13 +205,21 @@ def start_background_tasks() -> None:
 
 async def stop_background_tasks() -> None:
     """Stop cleanup loop and wait for graceful shutdown."""
-    global _cleanup_task, _cookie_task, _health_task
+    global _cleanup_task, _cookie_task, _health_task, _history_queue, _history_task
     await _cancel_task(_cleanup_task)
     await _cancel_task(_cookie_task)
     await _cancel_task(_health_task)
     _cleanup_task = None
     _cookie_task = None
     _health_task = None
+    queue, writer = _history_queue, _history_task
+    _history_queue = None
+    _history_task = None
+    if queue is not None and writer is not None:
+        # Не отменяем писатель, а дописываем очередь до конца.
+        queue.put_nowait(None)
+        await writer
+    await wait_tmpdir_cleanups()
 
 
 async def _cancel_task(task: Optional[asyncio.Task[None]]) -> None:
@@ -152,4 +235,7 @@ async def _cancel_task(task: Optional[asyncio.Task[None]]) -> None:
 __all__ = [
     "start_background_tasks",
     "stop_background_tasks",
+    "record_download",
+    "schedule_tmpdir_cleanup",
+    "wait_tmpdir_cleanups",
 ]
@@ -4,7 +4,6 @@ from __future__ import annotations
 
 import config
 from bot_app import state
-from bot_app.runtime import global_download_semaphore
 from monitoring import set_metric_gauge
 
 
@@ -18,7 +17,7 @@ def update_pending_tokens_gauge() -> None:
 
 def update_queue_gauges() -> None:
     max_slots = max(1, getattr(config, "MAX_GLOBAL_CONCURRENT_DOWNLOADS", 1))
-    available = getattr(global_download_semaphore, "_value", 0)
-    in_use = max(0, max_slots - available)
+    in_use = state.global_slots_in_use
+    available = max(0, max_slots - in_use)
     set_metric_gauge("downloads.queue_available", available)
     set_metric_gauge("downloads.queue_in_use", in_use)
\ No newline at end of file
@@ -4,8 +4,10 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from typing import Any, Awaitable, Callable, TypeVar
 
 from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramRetryAfter
 
 import config
 from monitoring import setup_logging
@@ -30,9 +32,31 @@ dp = Dispatcher()
 MAX_CONCURRENT = getattr(config, "MAX_GLOBAL_CONCURRENT_DOWNLOADS", 4)
 global_download_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
 
+# Отдельный лимит на одновременные отправки файлов в Telegram: загрузки
+# и выгрузки больше не делят один семафор.
+MAX_CONCURRENT_UPLOADS = getattr(config, "MAX_CONCURRENT_UPLOADS", 8)
+global_upload_semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+_T = TypeVar("_T")
+
+
+async def send_with_upload_slot(send: Callable[..., Awaitable[_T]], **kwargs: Any) -> _T:
+    """Call a bot send method under the upload semaphore, retrying once after FLOOD_WAIT."""
+    async with global_upload_semaphore:
+        try:
+            return await send(**kwargs)
+        except TelegramRetryAfter as err:
+            # Слот держим на время паузы, чтобы не усугублять flood control.
+            logger.warning("Telegram flood control, retrying upload in %ss", err.retry_after)
+            await asyncio.sleep(err.retry_after)
+            return await send(**kwargs)
+
+
 __all__ = [
     "bot",
     "dp",
     "logger",
     "global_download_semaphore",
+    "global_upload_semaphore",
+    "send_with_upload_slot",
 ]
@@ -2,38 +2,140 @@
 
 from __future__ import annotations
 
-from collections import deque
-from typing import Deque, Dict, Any
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
 
 # Per-user throttling bookkeeping
 user_last_request_ts: Dict[int, float] = {}
 user_active_downloads: Dict[int, int] = {}
+# Пользователи с ненулевым счётчиком: снимок для админки обходит только их,
+# а не всех, кто когда-либо что-то скачивал.
+active_user_ids: Set[int] = set()
 
 # Per-chat/global callback throttling
 chat_last_callback_ts: Dict[int, float] = {}
-global_callback_events: Deque[float] = deque()
+# Глобальный лимит нажатий — token bucket: запас токенов и время последнего пополнения
+# (0.0 означает «ещё не использовался», бакет стартует полным).
+global_rate_tokens: float = 0.0
+global_rate_last_refill: float = 0.0
+
+# Занятые слоты глобального семафора загрузок (читают админка и health-монитор).
+global_slots_in_use: int = 0
 
 # Pending downloads triggered via inline buttons
-token_payload = Dict[str, Any]
-pending_downloads: Dict[str, token_payload] = {}
+@dataclass(slots=True)
+class PendingDownload:
+    ts: float
+    url: str
+    initiator_id: Optional[int] = None
+    source_chat_id: Optional[int] = None
+    source_message_id: Optional[int] = None
+    platform: str = ""
+
+
+# Словарь хранит порядок вставки, поэтому первыми идут самые старые токены.
+pending_downloads: Dict[str, PendingDownload] = {}
 PENDING_TOKEN_TTL = 10 * 60  # seconds
+PENDING_TOKENS_LIMIT = 10_000
+
+# Последний текст статусных сообщений: повторный edit_text с тем же текстом
+# Telegram всё равно отклонит, а лимит запросов бота он расходует.
+status_texts: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+STATUS_TEXTS_LIMIT = 1024
 
 
 def total_active_downloads() -> int:
-    return sum(user_active_downloads.values())
+    return sum(user_active_downloads.get(uid, 0) for uid in active_user_ids)
+
+
+def reserve_user_slot(user_id: int) -> int:
+    """Count a new active download for the user and return the updated total."""
+    active = user_active_downloads.get(user_id, 0) + 1
+    user_active_downloads[user_id] = active
+    active_user_ids.add(user_id)
+    return active
+
+
+def release_user_slot(user_id: int) -> None:
+    """Undo reserve_user_slot once the download finishes."""
+    remaining = max(0, user_active_downloads.get(user_id, 0) - 1)
+    user_active_downloads[user_id] = remaining
+    if remaining == 0:
+        active_user_ids.discard(user_id)
+
+
+def _status_key(message: Any) -> Optional[Tuple[int, int]]:
+    chat_id = getattr(getattr(message, "chat", None), "id", None)
+    message_id = getattr(message, "message_id", None)
+    if chat_id is None or message_id is None:
+        return None
+    return chat_id, message_id
+
+
+def status_text_unchanged(message: Any, text: str) -> bool:
+    """Return True if ``message`` already shows ``text``."""
+    key = _status_key(message)
+    if key is None:
+        return False
+    return status_texts.get(key, getattr(message, "text", None)) == text
+
+
+def remember_status_text(message: Any, text: str) -> None:
+    """Record the text a status message was successfully edited to."""
+    key = _status_key(message)
+    if key is None:
+        return
+    status_texts[key] = text
+    status_texts.move_to_end(key)
+    while len(status_texts) > STATUS_TEXTS_LIMIT:
+        status_texts.popitem(last=False)
+
+
+def add_pending_download(token: str, entry: PendingDownload) -> None:
+    """Store a pending token, evicting the oldest ones beyond PENDING_TOKENS_LIMIT."""
+    pending_downloads[token] = entry
+    while len(pending_downloads) > PENDING_TOKENS_LIMIT:
+        pending_downloads.pop(next(iter(pending_downloads)))
 
 
 def pending_tokens_count() -> int:
     return len(pending_downloads)
 
 
+@asynccontextmanager
+async def slot_usage(semaphore: asyncio.Semaphore) -> AsyncIterator[None]:
+    """Acquire a global download slot and count it in ``global_slots_in_use``."""
+    global global_slots_in_use
+    async with semaphore:
+        global_slots_in_use += 1
+        try:
+            yield
+        finally:
+            global_slots_in_use -= 1
+
+
 __all__ = [
     "user_last_request_ts",
     "user_active_downloads",
+    "active_user_ids",
+    "PendingDownload",
     "pending_downloads",
+    "add_pending_download",
     "chat_last_callback_ts",
-    "global_callback_events",
+    "global_rate_tokens",
+    "global_rate_last_refill",
+    "global_slots_in_use",
+    "slot_usage",
     "total_active_downloads",
+    "reserve_user_slot",
+    "release_user_slot",
     "pending_tokens_count",
     "PENDING_TOKEN_TTL",
+    "PENDING_TOKENS_LIMIT",
+    "status_texts",
+    "status_text_unchanged",
+    "remember_status_text",
 ]
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import functools
 from typing import Dict, Optional
 
 DEFAULT_LOCALE = "ru"
@@ -217,8 +218,9 @@ def get_locale(language_code: Optional[str]) -> str:
     return normalized if normalized in SUPPORTED_LOCALES else DEFAULT_LOCALE
 
 
-def translate(key: str, locale: Optional[str] = None, **kwargs) -> str:
-    """Return translated text for the given key with graceful fallback."""
+@functools.lru_cache(maxsize=1024)
+def translate_raw(key: str, locale: Optional[str] = None) -> str:
+    """Return the unformatted template for the given key with graceful fallback."""
 
     lang = locale or DEFAULT_LOCALE
     if lang not in _TRANSLATIONS:
@@ -226,6 +228,13 @@ def translate(key: str, locale: Optional[str] = None, **kwargs) -> str:
     template = _TRANSLATIONS[lang].get(key)
     if template is None:
         template = _TRANSLATIONS[DEFAULT_LOCALE].get(key, key)
+    return template
+
+
+def translate(key: str, locale: Optional[str] = None, **kwargs) -> str:
+    """Return translated text for the given key with graceful fallback."""
+
+    template = translate_raw(key, locale)
     try:
         return template.format(**kwargs)
     except Exception:
@@ -233,4 +242,4 @@ def translate(key: str, locale: Optional[str] = None, **kwargs) -> str:
         return template
 
 
-__all__ = ["DEFAULT_LOCALE", "SUPPORTED_LOCALES", "get_locale", "translate"]
+__all__ = ["DEFAULT_LOCALE", "SUPPORTED_LOCALES", "get_locale", "translate", "translate_raw"]
@@ -192,6 +192,13 @@ MAX_GLOBAL_CONCURRENT_DOWNLOADS = _int_setting(
 	min_value=1,
 	max_value=32,
 )
+# Ограничение одновременных отправок файлов в Telegram
+MAX_CONCURRENT_UPLOADS = _int_setting(
+	"MAX_CONCURRENT_UPLOADS",
+	default=8,
+	min_value=1,
+	max_value=32,
+)
 # опционально
 YTDLP_COOKIES_FILE = os.environ.get("YTDLP_COOKIES_FILE", None)
 
@@ -312,6 +319,13 @@ ADMIN_PANEL_SESSION_TTL_SECONDS = _int_setting(
 	min_value=300,
 	max_value=7 * 24 * 60 * 60,
 )
+# Сколько секунд админка переиспользует собранный снимок статистики (0 — без кэша).
+ADMIN_PANEL_CACHE_TTL_SECONDS = _int_setting(
+	"ADMIN_PANEL_CACHE_TTL_SECONDS",
+	default=3,
+	min_value=0,
+	max_value=300,
+)
 
 
 def _coerce_positive_int(value, default: int) -> int:
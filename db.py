@@ -10,7 +10,7 @@ import json
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence
 
 import sqlalchemy as sa
 from sqlalchemy import func, select
@@ -59,6 +59,11 @@ downloads = sa.Table(
     sa.Column("timestamp", sa.DateTime(timezone=True), server_default=func.now()),
     sa.Column("error_message", sa.Text),
 )
+# Индексы под выборки дашборда: последние загрузки, срезы по чату/пользователю и платформам.
+sa.Index("ix_downloads_timestamp", downloads.c.timestamp)
+sa.Index("ix_downloads_chat_id_ts", downloads.c.chat_id, downloads.c.timestamp)
+sa.Index("ix_downloads_user_id_ts", downloads.c.user_id, downloads.c.timestamp)
+sa.Index("ix_downloads_platform_status", downloads.c.platform, downloads.c.status)
 
 user_stats = sa.Table(
     "user_stats",
@@ -117,7 +122,13 @@ user_quotas = sa.Table(
     "user_quotas",
     metadata,
     sa.Column("user_id", sa.BigInteger, primary_key=True),
-    sa.Column("plan", sa.Text, sa.ForeignKey("subscription_plans.plan", onupdate="CASCADE"), nullable=False),
+    sa.Column(
+        "plan",
+        sa.Text,
+        sa.ForeignKey("subscription_plans.plan", onupdate="CASCADE"),
+        nullable=False,
+        index=True,
+    ),
     sa.Column("custom_daily_quota", sa.Integer),
     sa.Column("custom_monthly_quota", sa.Integer),
     sa.Column("daily_used", sa.Integer, nullable=False, server_default="0"),
@@ -132,7 +143,7 @@ health_alerts = sa.Table(
     "health_alerts",
     metadata,
     sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
-    sa.Column("code", sa.Text, nullable=False, index=True),
+    sa.Column("code", sa.Text, nullable=False),
     sa.Column("severity", sa.Text, nullable=False, server_default="warning"),
     sa.Column("message", sa.Text, nullable=False),
     sa.Column("details", sa.Text),
@@ -141,6 +152,9 @@ health_alerts = sa.Table(
     sa.Column("created_at", sa.DateTime(timezone=True), server_default=func.now()),
     sa.Column("updated_at", sa.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
     sa.Column("resolved_at", sa.DateTime(timezone=True)),
+    # Поиск открытого алерта по коду сразу отдаёт строки в порядке created_at DESC.
+    sa.Index("ix_health_alerts_code_status", "code", "status", "created_at"),
+    sa.Index("ix_health_alerts_created_at", "created_at"),
 )
 
 referral_codes = sa.Table(
@@ -148,7 +162,7 @@ referral_codes = sa.Table(
     metadata,
     sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
     sa.Column("code", sa.Text, nullable=False, unique=True),
-    sa.Column("user_id", sa.BigInteger, nullable=False, index=True),
+    sa.Column("user_id", sa.BigInteger, nullable=False),
     sa.Column("max_uses", sa.Integer, nullable=False, server_default="0"),
     sa.Column("usage_count", sa.Integer, nullable=False, server_default="0"),
     sa.Column("expires_at", sa.DateTime(timezone=True)),
@@ -157,14 +171,21 @@ referral_codes = sa.Table(
     sa.Column("notes", sa.Text),
     sa.Column("created_at", sa.DateTime(timezone=True), server_default=func.now()),
     sa.Column("updated_at", sa.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+    # ensure_personal_code ищет у пользователя код без срока или с ещё не истёкшим сроком.
+    sa.Index("ix_referral_codes_user_active", "user_id", "expires_at"),
 )
 
 referral_events = sa.Table(
     "referral_events",
     metadata,
     sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
-    sa.Column("code_id", sa.Integer, sa.ForeignKey("referral_codes.id", ondelete="SET NULL")),
-    sa.Column("referrer_user_id", sa.BigInteger, nullable=False, index=True),
+    sa.Column(
+        "code_id",
+        sa.Integer,
+        sa.ForeignKey("referral_codes.id", ondelete="SET NULL"),
+        index=True,
+    ),
+    sa.Column("referrer_user_id", sa.BigInteger, nullable=False),
     sa.Column("referred_user_id", sa.BigInteger, nullable=False, unique=True),
     sa.Column("status", sa.Text, nullable=False, server_default="pending"),
     sa.Column("reward_daily_bonus", sa.Integer, nullable=False, server_default="0"),
@@ -174,6 +195,14 @@ referral_events = sa.Table(
     sa.Column("confirmed_at", sa.DateTime(timezone=True)),
     sa.Column("created_at", sa.DateTime(timezone=True), server_default=func.now()),
     sa.Column("updated_at", sa.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+    # Составной индекс покрывает и выборки только по referrer_user_id (ведущая колонка);
+    # INCLUDE с бонусами позволяет считать рейтинг рефереров index-only scan на PostgreSQL.
+    sa.Index(
+        "ix_referral_events_leaderboard",
+        "referrer_user_id",
+        "status",
+        postgresql_include=["reward_daily_bonus", "reward_monthly_bonus"],
+    ),
 )
 
 # ---------------------------------------------------------------------------
@@ -252,11 +281,14 @@ def ensure_user_quota(user_id: int, *, plan: Optional[str] = None) -> None:
     if not user_id:
         return
 
+    with _engine.begin() as conn:
+        conn.execute(_user_quota_insert(user_id, plan))
+
+
+def _user_quota_insert(user_id: int, plan: Optional[str]) -> sa.sql.dml.Insert:
     plan_key = (plan or config.DEFAULT_SUBSCRIPTION_PLAN or "free").strip().lower() or "free"
     stmt = _dialect_insert(user_quotas).values(user_id=user_id, plan=plan_key)
-    stmt = stmt.on_conflict_do_nothing(index_elements=[user_quotas.c.user_id])
-    with _engine.begin() as conn:
-        conn.execute(stmt)
+    return stmt.on_conflict_do_nothing(index_elements=[user_quotas.c.user_id])
 
 
 # ---------------------------------------------------------------------------
@@ -269,7 +301,8 @@ def init_db() -> None:
     logger.info("✓ База данных инициализирована: %s", DATABASE_URL)
 
 
-def add_download(
+def _write_download(
+    conn: sa.Connection,
     user_id: int,
     username: Optional[str],
     platform: str,
@@ -279,72 +312,115 @@ def add_download(
     file_size_bytes: Optional[int] = None,
     duration_seconds: Optional[float] = None,
     error_message: Optional[str] = None,
-) -> bool:
+) -> None:
     size = file_size_bytes or 0
     failures = 0 if status == "success" else 1
-    ensure_user_quota(user_id, plan=config.DEFAULT_SUBSCRIPTION_PLAN)
-    try:
-        with _engine.begin() as conn:
-            conn.execute(
-                downloads.insert().values(
-                    user_id=user_id,
-                    username=username,
-                    platform=platform,
-                    url=url,
-                    chat_id=chat_id,
-                    status=status,
-                    file_size_bytes=file_size_bytes,
-                    duration_seconds=duration_seconds,
-                    error_message=error_message,
-                )
-            )
+    if user_id:
+        conn.execute(_user_quota_insert(user_id, config.DEFAULT_SUBSCRIPTION_PLAN))
+    conn.execute(
+        downloads.insert().values(
+            user_id=user_id,
+            username=username,
+            platform=platform,
+            url=url,
+            chat_id=chat_id,
+            status=status,
+            file_size_bytes=file_size_bytes,
+            duration_seconds=duration_seconds,
+            error_message=error_message,
+        )
+    )
 
-            user_stmt = _dialect_insert(user_stats).values(
-                user_id=user_id,
-                username=username,
-                total_downloads=1,
-                total_bytes=size,
-                last_download=func.now(),
-                failed_count=failures,
-            )
-            user_stmt = user_stmt.on_conflict_do_update(
-                index_elements=[user_stats.c.user_id],
-                set_={
-                    "username": func.coalesce(user_stmt.excluded.username, user_stats.c.username),
-                    "total_downloads": user_stats.c.total_downloads + user_stmt.excluded.total_downloads,
-                    "total_bytes": user_stats.c.total_bytes + user_stmt.excluded.total_bytes,
-                    "last_download": func.now(),
-                    "failed_count": user_stats.c.failed_count + user_stmt.excluded.failed_count,
-                },
-            )
-            conn.execute(user_stmt)
+    user_stmt = _dialect_insert(user_stats).values(
+        user_id=user_id,
+        username=username,
+        total_downloads=1,
+        total_bytes=size,
+        last_download=func.now(),
+        failed_count=failures,
+    )
+    user_stmt = user_stmt.on_conflict_do_update(
+        index_elements=[user_stats.c.user_id],
+        set_={
+            "username": func.coalesce(user_stmt.excluded.username, user_stats.c.username),
+            "total_downloads": user_stats.c.total_downloads + user_stmt.excluded.total_downloads,
+            "total_bytes": user_stats.c.total_bytes + user_stmt.excluded.total_bytes,
+            "last_download": func.now(),
+            "failed_count": user_stats.c.failed_count + user_stmt.excluded.failed_count,
+        },
+    )
+    conn.execute(user_stmt)
 
-            platform_stmt = _dialect_insert(platform_stats).values(
-                platform=platform,
-                download_count=1,
-                total_bytes=size,
-                failed_count=failures,
-            )
-            platform_stmt = platform_stmt.on_conflict_do_update(
-                index_elements=[platform_stats.c.platform],
-                set_={
-                    "download_count": platform_stats.c.download_count + platform_stmt.excluded.download_count,
-                    "total_bytes": platform_stats.c.total_bytes + platform_stmt.excluded.total_bytes,
-                    "failed_count": platform_stats.c.failed_count + platform_stmt.excluded.failed_count,
-                },
-            )
-            conn.execute(platform_stmt)
+    platform_stmt = _dialect_insert(platform_stats).values(
+        platform=platform,
+        download_count=1,
+        total_bytes=size,
+        failed_count=failures,
+    )
+    platform_stmt = platform_stmt.on_conflict_do_update(
+        index_elements=[platform_stats.c.platform],
+        set_={
+            "download_count": platform_stats.c.download_count + platform_stmt.excluded.download_count,
+            "total_bytes": platform_stats.c.total_bytes + platform_stmt.excluded.total_bytes,
+            "failed_count": platform_stats.c.failed_count + platform_stmt.excluded.failed_count,
+        },
+    )
+    conn.execute(platform_stmt)
+
+
+def add_downloads(records: Sequence[Mapping[str, Any]]) -> bool:
+    """Persist several download records (``add_download`` kwargs) in one transaction."""
+
+    if not records:
+        return True
+    try:
+        with _engine.begin() as conn:
+            for record in records:
+                _write_download(conn, **record)
+    except Exception:
+        if len(records) == 1:
+            logger.exception("Ошибка при добавлении записи в БД")
+            return False
+        # Одна битая запись не должна откатывать всю пачку.
+        logger.warning("Пакетная запись не удалась, сохраняем по одной (%s шт.)", len(records))
+        return all([add_downloads([record]) for record in records])
+    for record in records:
         logger.info(
             "✓ Запись о загрузке сохранена в БД: user=%s, platform=%s, status=%s, chat_id=%s",
-            user_id,
-            platform,
-            status,
-            chat_id,
+            record.get("user_id"),
+            record.get("platform"),
+            record.get("status", "success"),
+            record.get("chat_id"),
         )
-        return True
-    except Exception:
-        logger.exception("Ошибка при добавлении записи в БД")
-        return False
+    return True
+
+
+def add_download(
+    user_id: int,
+    username: Optional[str],
+    platform: str,
+    url: str,
+    chat_id: Optional[int] = None,
+    status: str = "success",
+    file_size_bytes: Optional[int] = None,
+    duration_seconds: Optional[float] = None,
+    error_message: Optional[str] = None,
+) -> bool:
+    return add_downloads(
+        [
+            {
+                "user_id": user_id,
+                "username": username,
+                "platform": platform,
+                "url": url,
+                "chat_id": chat_id,
+                "status": status,
+                "file_size_bytes": file_size_bytes,
+                "duration_seconds": duration_seconds,
+                "error_message": error_message,
+            }
+        ]
+    )
 
 
 def upsert_chat(chat_id: int, title: Optional[str], chat_type: Optional[str]) -> None:
@@ -487,6 +563,11 @@ def cleanup_old_records(days: int = 30) -> int:
         result = conn.execute(downloads.delete().where(downloads.c.timestamp < cutoff))
     deleted = result.rowcount or 0
     logger.info("✓ Удалено %d старых записей (старше %d дней)", deleted, days)
+    if deleted:
+        # services.stats сам импортирует db, поэтому импорт отложен до вызова.
+        from services.stats import invalidate_stats_cache
+
+        invalidate_stats_cache()
     return deleted
 
 
@@ -536,6 +617,7 @@ def get_engine() -> Engine:
 __all__ = [
     "init_db",
     "add_download",
+    "add_downloads",
     "upsert_chat",
     "get_user_stats",
     "get_all_user_stats",
@@ -25,6 +25,7 @@ from bot_app.ui.i18n import get_locale, translate
 from bot_app.referral import build_profile_view
 from monitoring import HealthCheckServer
 from admin_panel_web import AdminPanelServer
+from utils.access_control import invalidate_admin_status
 
 logger = logging.getLogger(__name__)
 
@@ -137,7 +138,7 @@ async def cmd_start_handler(message: types.Message):
     await _send_profile(message, locale, section=profile_section)
 
 
-@dp.callback_query(lambda cq: (cq.data or "").startswith("start:"))
+@dp.callback_query(F.data.startswith("start:"))
 async def start_cta_callback(callback_query: types.CallbackQuery):
     """Обработчик инлайн-кнопок на /start."""
 
@@ -220,6 +221,7 @@ export ADMIN_USER_IDS="{message.from_user.id}"
             await message.reply("❗ Не удалось проверить ваш статус администратора.")
             return
 
+        invalidate_admin_status(message.chat.id)
         try:
             ok = add_authorized_admin(uid, message.from_user.username)
             if ok:
@@ -234,6 +236,7 @@ export ADMIN_USER_IDS="{message.from_user.id}"
     async def cmd_revoke_me_handler(message: types.Message):
         """Команда /revoke_me — отозвать свою авторизацию."""
         uid = message.from_user.id
+        invalidate_admin_status(message.chat.id)
         try:
             ok = remove_authorized_admin(uid)
             if ok:
@@ -567,6 +570,7 @@ export ADMIN_USER_IDS="{message.from_user.id}"
         except ValueError as exc:
             await message.reply(str(exc))
             return
+        invalidate_admin_status(message.chat.id)
 
         locale = get_locale(getattr(getattr(message, "from_user", None), "language_code", None))
         summary = quota_ui.quota_summary(plan, locale, admin=True, target_user_id=target_id)
@@ -580,6 +584,7 @@ export ADMIN_USER_IDS="{message.from_user.id}"
         и добавляет их в `authorized_admins` (чтобы они могли в лс получать статистику).
         """
         try:
+            invalidate_admin_status(update.chat.id)
             new_status = getattr(update, 'new_chat_member', None)
             if not new_status:
                 return
@@ -608,6 +613,12 @@ export ADMIN_USER_IDS="{message.from_user.id}"
             logger.exception("Ошибка в обработчике my_chat_member: %s", e)
 
 
+@dp.chat_member()
+async def handle_chat_member(update: types.ChatMemberUpdated):
+    """Сбросить кеш прав администратора, когда в чате меняется статус участника."""
+    invalidate_admin_status(update.chat.id)
+
+
 # ---------- Запуск polling ----------
 async def main():
     logger.info("Бот запущен (long-polling).")
@@ -650,7 +661,7 @@ async def main():
         if health_server:
             health_server.shutdown()
         if admin_panel_server:
-            admin_panel_server.shutdown()
+            await admin_panel_server.shutdown_async()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ from contextlib import contextmanager
 from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Any, Dict, Mapping, Optional
 
 from aiohttp import web
 
@@ -78,6 +78,19 @@ class MetricsRegistry:
             self._gauges[name] = value
             self._stamp = time.time()
 
+    def record(
+        self,
+        counters: Optional[Mapping[str, int]] = None,
+        gauges: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        """Apply several counter increments and gauge updates under one lock."""
+        with self._lock:
+            if counters:
+                self._counters.update(counters)
+            if gauges:
+                self._gauges.update(gauges)
+            self._stamp = time.time()
+
     def snapshot(self) -> Dict[str, object]:
         with self._lock:
             return {
@@ -103,6 +116,13 @@ def set_metric_gauge(name: str, value: float) -> None:
     _metrics.set_gauge(name, value)
 
 
+def record_metrics(
+    counters: Optional[Mapping[str, int]] = None,
+    gauges: Optional[Mapping[str, float]] = None,
+) -> None:
+    _metrics.record(counters, gauges)
+
+
 def get_health_snapshot() -> Dict[str, object]:
     """Return in-process health data for embedding in admin panel."""
 
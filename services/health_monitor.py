@@ -9,7 +9,7 @@ from typing import Dict, Iterable, Optional
 
 import config
 from bot_app import state
-from bot_app.runtime import bot, global_download_semaphore
+from bot_app.runtime import bot
 from monitoring import get_metrics_registry
 from services import alerts as alert_service
 
@@ -125,8 +125,7 @@ async def _check_queue_stuck(
     interval: int,
 ) -> int:
     max_slots = max(1, getattr(config, "MAX_GLOBAL_CONCURRENT_DOWNLOADS", 1))
-    available = getattr(global_download_semaphore, "_value", 0)
-    in_use = max_slots - max(0, available)
+    in_use = state.global_slots_in_use
     saturated = in_use >= max_slots and pending > 0
 
     if saturated:
@@ -2,9 +2,11 @@
 
 from __future__ import annotations
 
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 import sqlalchemy as sa
 
@@ -15,6 +17,12 @@ from .referrals import active_bonus_for_user
 UTC = timezone.utc
 _engine = get_engine()
 
+# Короткий кеш плана для хендлеров загрузки: повторные нажатия одного пользователя
+# в пределах окна не делают новые запросы к БД. Сбрасывается при изменении квоты.
+ENFORCEMENT_PLAN_TTL_SECONDS = 3.0
+_PLAN_CACHE_MAX_ENTRIES = 4096
+_plan_cache: "OrderedDict[int, Tuple[float, Dict[str, object]]]" = OrderedDict()
+
 _QUOTA_SELECT = (
     sa.select(
         user_quotas.c.user_id,
@@ -199,9 +207,35 @@ def build_enforcement_plan(user_id: int) -> Dict[str, object]:
     }
 
 
+def cached_enforcement_plan(user_id: int) -> Dict[str, object]:
+    """Return build_enforcement_plan(user_id), reusing a result younger than the TTL."""
+
+    now = time.monotonic()
+    cached = _plan_cache.get(user_id)
+    if cached and now - cached[0] < ENFORCEMENT_PLAN_TTL_SECONDS:
+        _plan_cache.move_to_end(user_id)
+        return cached[1]
+    plan = build_enforcement_plan(user_id)
+    _plan_cache[user_id] = (now, plan)
+    _plan_cache.move_to_end(user_id)
+    while len(_plan_cache) > _PLAN_CACHE_MAX_ENTRIES:
+        _plan_cache.popitem(last=False)
+    return plan
+
+
+def invalidate_enforcement_plan(user_id: Optional[int] = None) -> None:
+    """Drop the cached plan for ``user_id`` (or all users if None)."""
+
+    if user_id is None:
+        _plan_cache.clear()
+    else:
+        _plan_cache.pop(user_id, None)
+
+
 def consume_success(user_id: int, *, downloads: int = 1) -> None:
     """Increment quota counters after a successful download."""
 
+    invalidate_enforcement_plan(user_id)
     ensure_user_quota(user_id)
     now = _utcnow()
     with _engine.begin() as conn:
@@ -233,6 +267,8 @@ def assign_plan(
         raise ValueError("Неизвестный тариф. Доступно: " + ", ".join(sorted((config.SUBSCRIPTION_PLANS or {}).keys())))
 
     ensure_user_quota(user_id, plan=key)
+    invalidate_enforcement_plan(user_id)
+
     def _clean(value: Optional[int]) -> Optional[int]:
         if value is None:
             return None
@@ -270,6 +306,8 @@ __all__ = [
     "QuotaSnapshot",
     "get_quota_snapshot",
     "build_enforcement_plan",
+    "cached_enforcement_plan",
+    "invalidate_enforcement_plan",
     "consume_success",
     "assign_plan",
     "available_plans",
@@ -109,12 +109,22 @@ def ensure_personal_code(user_id: int) -> Dict[str, object]:
     if not user_id:
         raise ValueError("user_id is required")
 
-    now = _utcnow()
-    codes = list_user_codes(user_id)
-    for code in codes:
-        expires_at = code.get("expires_at")
-        if not expires_at or expires_at > now:
-            return code
+    stmt = (
+        sa.select(referral_codes)
+        .where(
+            referral_codes.c.user_id == user_id,
+            sa.or_(
+                referral_codes.c.expires_at.is_(None),
+                referral_codes.c.expires_at > _utcnow(),
+            ),
+        )
+        .order_by(referral_codes.c.created_at.desc())
+        .limit(1)
+    )
+    with _engine.connect() as conn:
+        row = conn.execute(stmt).mappings().first()
+    if row:
+        return dict(row)
     return create_referral_code(user_id)
 
 
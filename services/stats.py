@@ -2,15 +2,73 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Mapping, Optional
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, TypeVar
 
 import sqlalchemy as sa
 from sqlalchemy import func, select
 
-from db import chats, downloads, subscription_plans, user_quotas, get_engine
+from db import downloads, subscription_plans, user_quotas, get_engine
 
 _engine = get_engine()
 
+T = TypeVar("T")
+
+# Ответы команд статистики кешируются на (kind, chat_id); запись новой загрузки
+# сбрасывает ключи своего чата через invalidate_stats_cache(), поэтому TTL длинный.
+STATS_CACHE_TTL_SECONDS = 600.0
+# Ключи вида user:{id} копятся по числу пользователей, поэтому размер ограничен.
+STATS_CACHE_MAX_ENTRIES = 512
+_STATS_CACHE: Dict[Tuple[str, Optional[int]], Tuple[float, object]] = {}
+# Загрузчики работают в to_thread, поэтому кеш правится из нескольких потоков.
+# Поколение растёт при каждой инвалидации: результат, прочитанный до неё, не сохраняется.
+_STATS_CACHE_LOCK = threading.Lock()
+_stats_generation = 0
+
+
+def cached_stats(kind: str, chat_id: Optional[int], loader: Callable[[], T]) -> T:
+    """Return ``loader()`` memoized per (kind, chat_id) for STATS_CACHE_TTL_SECONDS."""
+
+    key = (kind, chat_id)
+    with _STATS_CACHE_LOCK:
+        now = time.monotonic()
+        entry = _STATS_CACHE.get(key)
+        if entry is not None and now - entry[0] < STATS_CACHE_TTL_SECONDS:
+            return entry[1]  # type: ignore[return-value]
+        generation = _stats_generation
+    value = loader()
+    with _STATS_CACHE_LOCK:
+        if generation != _stats_generation:
+            return value
+        # Ключ переставляется в конец, так что порядок словаря совпадает с возрастом записей:
+        # истёкшие и лишние записи снимаются с начала.
+        _STATS_CACHE.pop(key, None)
+        while _STATS_CACHE:
+            oldest = next(iter(_STATS_CACHE))
+            if (
+                now - _STATS_CACHE[oldest][0] < STATS_CACHE_TTL_SECONDS
+                and len(_STATS_CACHE) < STATS_CACHE_MAX_ENTRIES
+            ):
+                break
+            del _STATS_CACHE[oldest]
+        _STATS_CACHE[key] = (now, value)
+    return value
+
+
+def invalidate_stats_cache(chat_id: Optional[int] = None) -> None:
+    """Drop cached stats for ``chat_id`` (and global scope) or everything if None."""
+
+    global _stats_generation
+    with _STATS_CACHE_LOCK:
+        _stats_generation += 1
+        if chat_id is None:
+            _STATS_CACHE.clear()
+            return
+        for key in list(_STATS_CACHE):
+            if key[1] == chat_id or key[1] is None:
+                del _STATS_CACHE[key]
+
 
 def _chat_filters(chat_id: Optional[int], column) -> List[sa.sql.ClauseElement]:
     return [column == chat_id] if chat_id is not None else []
@@ -51,6 +51,9 @@ def ensure_aiogram_stub() -> None:
         def my_chat_member(self, *args, **kwargs):
             return self._identity
 
+        def chat_member(self, *args, **kwargs):
+            return self._identity
+
         async def start_polling(self, *args, **kwargs):  # pragma: no cover - not used in tests
             return None
 
@@ -66,8 +69,9 @@ def ensure_aiogram_stub() -> None:
             pass
 
     class DummyFSInputFile:
-        def __init__(self, path: str | bytes):
+        def __init__(self, path: str | bytes, filename: str | None = None):
             self.path = path
+            self.filename = filename
 
     class DummyInlineKeyboardButton:
         def __init__(self, text: str, callback_data: str | None = None, url: str | None = None):
@@ -79,6 +83,15 @@ def ensure_aiogram_stub() -> None:
         def __init__(self, inline_keyboard):
             self.inline_keyboard = inline_keyboard
 
+    class DummyMagicFilter:
+        """Chainable stand-in for ``aiogram.F`` (``F.data.startswith(...)``)."""
+
+        def __getattr__(self, _name: str) -> "DummyMagicFilter":
+            return self
+
+        def __call__(self, *_args, **_kwargs) -> "DummyMagicFilter":
+            return self
+
     class DummyTelegramBadRequest(Exception):
         def __init__(self, *args, **_kwargs):
             super().__init__(*args)
@@ -88,11 +101,20 @@ def ensure_aiogram_stub() -> None:
             super().__init__(message)
             self.status_code = status_code
 
+    class DummyTelegramRetryAfter(Exception):
+        def __init__(self, method=None, message: str = "", retry_after: int = 0):
+            super().__init__(message)
+            self.retry_after = retry_after
+
     aiogram_module.Bot = DummyBot
     aiogram_module.Dispatcher = DummyDispatcher
+    aiogram_module.F = DummyMagicFilter()
     aiogram_module.types = aiogram_types_module
     aiogram_module.filters = aiogram_filters_module
 
+    # Классы апдейтов нужны только для аннотаций и isinstance-проверок в хендлерах.
+    for name in ("Message", "CallbackQuery", "Chat", "User", "ChatMemberUpdated"):
+        setattr(aiogram_types_module, name, type(name, (), {}))
     aiogram_types_module.FSInputFile = DummyFSInputFile
     aiogram_types_module.InlineKeyboardButton = DummyInlineKeyboardButton
     aiogram_types_module.InlineKeyboardMarkup = DummyInlineKeyboardMarkup
@@ -101,6 +123,7 @@ def ensure_aiogram_stub() -> None:
 
     aiogram_exceptions_module.TelegramBadRequest = DummyTelegramBadRequest
     aiogram_exceptions_module.TelegramAPIError = DummyTelegramAPIError
+    aiogram_exceptions_module.TelegramRetryAfter = DummyTelegramRetryAfter
 
     sys.modules["aiogram"] = aiogram_module
     sys.modules["aiogram.types"] = aiogram_types_module
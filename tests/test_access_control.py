@@ -31,6 +31,7 @@ class AccessControlTests(unittest.IsolatedAsyncioTestCase):
         self._orig_admin_only = config.ADMIN_ONLY
         self._orig_allowed = set(config.ALLOWED_USER_IDS)
         self._orig_admins = set(config.ADMIN_USER_IDS)
+        access_control.invalidate_admin_status()
 
     def tearDown(self):
         config.WHITELIST_MODE = self._orig_whitelist
@@ -70,6 +71,33 @@ class AccessControlTests(unittest.IsolatedAsyncioTestCase):
         config.ADMIN_USER_IDS = {6}
         self.assertTrue(await access_control.is_user_allowed(non_admin_msg))
 
+    async def test_group_admin_status_is_cached_until_invalidated(self):
+        config.WHITELIST_MODE = False
+        config.ADMIN_ONLY = True
+        config.ADMIN_USER_IDS = set()
+
+        bot = DummyBot(status_map={(200, 5): "administrator"})
+        msg = DummyMessage(user_id=5, chat_type="group", chat_id=200, bot=bot)
+        self.assertTrue(await access_control.is_user_allowed(msg))
+
+        bot.status_map.clear()
+        self.assertTrue(await access_control.is_user_allowed(msg))
+
+        access_control.invalidate_admin_status(200)
+        self.assertFalse(await access_control.is_user_allowed(msg))
+
+    async def test_refusal_is_not_cached_for_promoted_admin(self):
+        config.WHITELIST_MODE = False
+        config.ADMIN_ONLY = True
+        config.ADMIN_USER_IDS = set()
+
+        bot = DummyBot()
+        msg = DummyMessage(user_id=5, chat_type="group", chat_id=200, bot=bot)
+        self.assertFalse(await access_control.is_user_allowed(msg))
+
+        bot.status_map[(200, 5)] = "administrator"
+        self.assertTrue(await access_control.is_user_allowed(msg))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -25,6 +25,9 @@ class DummyMessage:
 
 
 class AdminPanelTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        panel.stats_service.invalidate_stats_cache()
+
     async def test_cmd_stats_private(self):
         msg = DummyMessage(chat_type="private")
 
@@ -113,5 +116,61 @@ class AdminPanelTests(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Ivan Petrov", text)
 
 
+    async def test_cmd_recent_rejects_non_admin(self):
+        msg = DummyMessage(chat_type="private")
+
+        with mock.patch.object(panel, "is_admin", mock.AsyncMock(return_value=False)), mock.patch.object(
+            panel.stats_service, "get_recent_downloads", return_value=[]
+        ):
+            await panel.cmd_recent(msg)
+
+        self.assertEqual(len(msg.replies), 1)
+        text, _ = msg.replies[0]
+        self.assertIn("Только администраторы", text)
+
+
+    async def test_cmd_stats_cache_invalidated_by_chat(self):
+        summary = {
+            "total_downloads": 1,
+            "successful_downloads": 1,
+            "failed_downloads": 0,
+            "total_bytes": 0,
+            "unique_users": 1,
+        }
+
+        with mock.patch.object(panel.stats_service, "get_summary", return_value=summary) as fetch:
+            await panel.cmd_stats(DummyMessage(chat_type="private", chat_id=9))
+            await panel.cmd_stats(DummyMessage(chat_type="private", chat_id=9))
+            self.assertEqual(fetch.call_count, 1)
+
+            panel.stats_service.invalidate_stats_cache(9)
+            await panel.cmd_stats(DummyMessage(chat_type="private", chat_id=9))
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_stats_cache_is_bounded(self):
+        stats = panel.stats_service
+        with mock.patch.object(stats, "STATS_CACHE_MAX_ENTRIES", 3):
+            for chat_id in range(5):
+                stats.cached_stats("user:1", chat_id, lambda: chat_id)
+            # Вытесняются самые старые ключи, свежие остаются.
+            self.assertEqual([key[1] for key in stats._STATS_CACHE], [2, 3, 4])
+
+        with mock.patch.object(stats.time, "monotonic", return_value=10_000_000.0):
+            stats.cached_stats("user:1", 99, lambda: 99)
+        self.assertEqual(list(stats._STATS_CACHE), [("user:1", 99)])
+
+    def test_result_loaded_before_invalidation_is_not_cached(self):
+        stats = panel.stats_service
+
+        def loader():
+            # Запись истории закоммичена, пока загрузчик читал старые данные.
+            stats.invalidate_stats_cache(9)
+            return "stale"
+
+        self.assertEqual(stats.cached_stats("summary", 9, loader), "stale")
+        self.assertNotIn(("summary", 9), stats._STATS_CACHE)
+        self.assertEqual(stats.cached_stats("summary", 9, lambda: "fresh"), "fresh")
+
+
 if __name__ == "__main__":
     unittest.main()
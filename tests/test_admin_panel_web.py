@@ -0,0 +1,86 @@
+import asyncio
+import datetime as dt
+import unittest
+from unittest import mock
+
+from tests.aiogram_stub import ensure_aiogram_stub
+
+ensure_aiogram_stub()
+
+import admin_panel_web
+
+
+class JsonEncodingTests(unittest.TestCase):
+    payload = {
+        "aware": dt.datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt.timezone.utc),
+        "naive": dt.datetime(2026, 1, 2, 3, 4, 5, 123),
+        "day": dt.date(2026, 1, 2),
+        "name": "Привет",
+        7: None,
+    }
+    expected = (
+        '{"aware":"2026-01-02T03:04:05+00:00","naive":"2026-01-02T03:04:05.000123",'
+        '"day":"2026-01-02","name":"Привет","7":null}'
+    ).encode("utf-8")
+
+    def test_stdlib_encoder_uses_isoformat(self):
+        with mock.patch.object(admin_panel_web, "orjson", None):
+            self.assertEqual(admin_panel_web._dumps_json(self.payload), self.expected)
+
+    def test_orjson_matches_stdlib_encoder(self):
+        if admin_panel_web.orjson is None:
+            self.skipTest("orjson is not installed")
+        self.assertEqual(admin_panel_web._dumps_json(self.payload), self.expected)
+
+
+
+class AcceptEncodingTests(unittest.TestCase):
+    def test_gzip_negotiation(self):
+        cases = {
+            "": False,
+            "gzip": True,
+            "gzip, deflate, br": True,
+            "deflate, GZIP;q=0.5": True,
+            "gzip;q=0": False,
+            "gzip; q=0.0, br": False,
+            "*": True,
+            "gzip;q=0, *": False,
+            "identity": False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertIs(admin_panel_web._accepts_gzip(header), expected)
+
+
+
+class DashboardCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def test_invalidation_discards_snapshot_collected_before_action(self):
+        server = admin_panel_web.AdminPanelServer("127.0.0.1", 0)
+        release = asyncio.Event()
+
+        async def slow_collect(**_kwargs):
+            await release.wait()
+            return {"summary": {}}
+
+        query = dict(
+            chat_id=None,
+            chat_sort="recent",
+            top_sort="downloads",
+            platform_sort="downloads",
+            search_query=None,
+            admin_identity=None,
+        )
+        with mock.patch.object(server._data_provider, "collect_dashboard", slow_collect):
+            collecting = asyncio.create_task(server._collect_dashboard(**query))
+            await asyncio.sleep(0)
+            server._invalidate_dashboard_cache()
+            release.set()
+            await collecting
+            await asyncio.sleep(0)
+
+        self.assertEqual(server._dashboard_cache, {})
+        self.assertEqual(server._dashboard_inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
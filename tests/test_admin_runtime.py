@@ -1,28 +1,34 @@
+import asyncio
 import time
 import unittest
 
+from admin_panel import RuntimeController
 from bot_app import admin_runtime, state
 
 
 class AdminRuntimeTests(unittest.TestCase):
     def setUp(self):
         state.user_active_downloads.clear()
+        state.active_user_ids.clear()
         state.user_last_request_ts.clear()
         state.pending_downloads.clear()
 
     def tearDown(self):
         state.user_active_downloads.clear()
+        state.active_user_ids.clear()
         state.user_last_request_ts.clear()
         state.pending_downloads.clear()
 
     def test_snapshot_includes_active_and_pending(self):
         state.user_active_downloads[123] = 2
+        state.active_user_ids.add(123)
         state.user_last_request_ts[123] = time.time() - 30
-        state.pending_downloads["tok-1"] = {
-            "ts": time.time() - 5,
-            "initiator_id": 999,
-            "source_chat_id": -1001,
-        }
+        state.pending_downloads["tok-1"] = state.PendingDownload(
+            ts=time.time() - 5,
+            url="https://example.com/video",
+            initiator_id=999,
+            source_chat_id=-1001,
+        )
 
         snapshot = admin_runtime.get_runtime_snapshot(pending_limit=5, active_limit=5)
 
@@ -36,16 +42,38 @@ class AdminRuntimeTests(unittest.TestCase):
         state.user_active_downloads[1] = 3
         state.user_last_request_ts[1] = time.time()
         self.assertTrue(admin_runtime.cancel_user_downloads(1))
-        self.assertEqual(state.user_active_downloads[1], 0)
+        self.assertNotIn(1, state.user_active_downloads)
+        self.assertNotIn(1, state.active_user_ids)
         self.assertFalse(admin_runtime.cancel_user_downloads(999))
 
     def test_flush_pending_tokens(self):
-        state.pending_downloads["a"] = {"ts": time.time()}
-        state.pending_downloads["b"] = {"ts": time.time()}
+        state.pending_downloads["a"] = state.PendingDownload(ts=time.time(), url="")
+        state.pending_downloads["b"] = state.PendingDownload(ts=time.time(), url="")
         cleared = admin_runtime.flush_pending_tokens()
         self.assertEqual(cleared, 2)
         self.assertEqual(state.pending_downloads, {})
 
 
+class RuntimeControllerLoopTests(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self):
+        state.pending_downloads.clear()
+
+    async def test_action_on_bot_loop_runs_inline(self):
+        state.pending_downloads["a"] = state.PendingDownload(ts=time.time(), url="")
+        controller = RuntimeController(bot_loop=asyncio.get_running_loop())
+
+        result = controller.perform_action("flush_tokens", {})
+
+        self.assertEqual(result, {"dropped": 1})
+
+    async def test_snapshot_from_worker_thread_uses_bot_loop(self):
+        state.pending_downloads["a"] = state.PendingDownload(ts=time.time(), url="")
+        controller = RuntimeController(bot_loop=asyncio.get_running_loop())
+
+        snapshot = await asyncio.to_thread(controller.snapshot)
+
+        self.assertEqual(snapshot["pending_total"], 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -16,7 +16,8 @@ import config
 from bot_app import state
 from bot_app.handlers import callbacks
 from bot_app.ui.i18n import translate
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from bot_app import runtime
 
 
 class DummyStatusMessage:
@@ -79,9 +80,10 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self) -> None:
         state.pending_downloads.clear()
         state.user_active_downloads.clear()
+        state.active_user_ids.clear()
         state.user_last_request_ts.clear()
         state.chat_last_callback_ts.clear()
-        state.global_callback_events.clear()
+        state.global_rate_last_refill = 0.0
         self.tempdir = tempfile.TemporaryDirectory()
         self.temp_path = Path(self.tempdir.name)
         self.temp_patch = mock.patch.object(config, "TEMP_DIR", self.temp_path)
@@ -93,10 +95,10 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
 
     async def test_callback_rejects_expired_token(self) -> None:
         token = "expired"
-        state.pending_downloads[token] = {
-            "url": "http://example.com",
-            "ts": time.time() - state.PENDING_TOKEN_TTL - 1,
-        }
+        state.pending_downloads[token] = state.PendingDownload(
+            ts=time.time() - state.PENDING_TOKEN_TTL - 1,
+            url="http://example.com",
+        )
         callback = DummyCallback(token)
 
         await callbacks.handle_download_callback(callback)
@@ -108,12 +110,12 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
     async def test_callback_processes_valid_download(self) -> None:
         token = "valid"
         callback = DummyCallback(token)
-        state.pending_downloads[token] = {
-            "url": "https://youtu.be/example",
-            "ts": time.time(),
-            "source_chat_id": callback.message.chat.id,
-            "source_message_id": 555,
-        }
+        state.pending_downloads[token] = state.PendingDownload(
+            ts=time.time(),
+            url="https://youtu.be/example",
+            source_chat_id=callback.message.chat.id,
+            source_message_id=555,
+        )
         fake_bot = FakeBot()
 
         async def fake_download(url, tmpdir, timeout, cookies_file=None, **_kwargs):  # noqa: ARG001
@@ -147,10 +149,10 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
     async def test_callback_photo_flow_uses_send_photo_and_caption(self) -> None:
         token = "photo"
         callback = DummyCallback(token)
-        state.pending_downloads[token] = {
-            "url": "https://instagram.com/p/photo",
-            "ts": time.time(),
-        }
+        state.pending_downloads[token] = state.PendingDownload(
+            ts=time.time(),
+            url="https://instagram.com/p/photo",
+        )
         photo_path = self.temp_path / "photo.jpg"
         photo_path.write_bytes(b"img")
 
@@ -184,10 +186,10 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
     async def test_callback_photo_flow_document_fallback_uses_caption(self) -> None:
         token = "photo-fallback"
         callback = DummyCallback(token)
-        state.pending_downloads[token] = {
-            "url": "https://instagram.com/p/photo2",
-            "ts": time.time(),
-        }
+        state.pending_downloads[token] = state.PendingDownload(
+            ts=time.time(),
+            url="https://instagram.com/p/photo2",
+        )
         photo_path = self.temp_path / "photo2.jpg"
         photo_path.write_bytes(b"img")
 
@@ -222,6 +224,115 @@ class CallbackHandlerTests(unittest.IsolatedAsyncioTestCase):
         )
         self.assertEqual(caption, expected_caption)
 
+    async def test_concurrent_clicks_respect_per_user_limit(self) -> None:
+        class YieldingCallback(DummyCallback):
+            async def answer(self, text: str, show_alert: bool = False):
+                await asyncio.sleep(0)
+                await super().answer(text, show_alert=show_alert)
+
+        first = YieldingCallback("first", message=DummyMessage(chat_id=1))
+        second = YieldingCallback("second", message=DummyMessage(chat_id=2))
+        for token in ("first", "second"):
+            state.pending_downloads[token] = state.PendingDownload(
+                ts=time.time(), url="https://youtu.be/example"
+            )
+        release = asyncio.Event()
+
+        async def fake_download(url, tmpdir, timeout, cookies_file=None, **_kwargs):  # noqa: ARG001
+            await release.wait()
+            raise RuntimeError("stop")
+
+        with (
+            mock.patch.object(callbacks, "bot", FakeBot()),
+            mock.patch.object(callbacks, "download_video", fake_download),
+            mock.patch.object(callbacks, "is_user_allowed", mock.AsyncMock(return_value=True)),
+            mock.patch.object(callbacks, "capture_exception", lambda *args, **kwargs: None),
+            mock.patch.object(callbacks, "_MAX_CONCURRENT_PER_USER", 1),
+            mock.patch.object(callbacks, "_USER_COOLDOWN_SECONDS", 0),
+        ):
+            tasks = [
+                asyncio.create_task(callbacks.handle_download_callback(cb))
+                for cb in (first, second)
+            ]
+            # Одно из нажатий отклоняется сразу, второе ждёт release внутри загрузки.
+            done, _ = await asyncio.wait(tasks, timeout=5, return_when=asyncio.FIRST_COMPLETED)
+            release.set()
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+
+        self.assertEqual(len(done), 1)
+        limit_text = translate("download.active_limit", None, active=1, limit=1)
+        rejected = [cb for cb in (first, second) if {"text": limit_text, "show_alert": True} in cb.answers]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(state.user_active_downloads.get(42, 0), 0)
+        self.assertNotIn(42, state.active_user_ids)
+
+
+class GlobalRateLimitTests(unittest.TestCase):
+    def setUp(self) -> None:
+        state.global_rate_last_refill = 0.0
+        self.addCleanup(setattr, state, "global_rate_last_refill", 0.0)
+
+    def test_bucket_allows_burst_then_refills(self) -> None:
+        with (
+            mock.patch.object(callbacks, "_CALLBACK_GLOBAL_MAX_CALLS", 2),
+            mock.patch.object(callbacks, "_CALLBACK_GLOBAL_WINDOW", 10),
+        ):
+            self.assertTrue(callbacks._consume_global_rate_slot(100.0))
+            self.assertTrue(callbacks._consume_global_rate_slot(100.1))
+            self.assertFalse(callbacks._consume_global_rate_slot(100.2))
+            # Токен восстанавливается за window / limit = 5 секунд.
+            self.assertTrue(callbacks._consume_global_rate_slot(105.3))
+            self.assertFalse(callbacks._consume_global_rate_slot(105.4))
+
+    def test_bucket_ignores_out_of_order_timestamps(self) -> None:
+        with (
+            mock.patch.object(callbacks, "_CALLBACK_GLOBAL_MAX_CALLS", 2),
+            mock.patch.object(callbacks, "_CALLBACK_GLOBAL_WINDOW", 10),
+        ):
+            self.assertTrue(callbacks._consume_global_rate_slot(100.0))
+            self.assertTrue(callbacks._consume_global_rate_slot(100.0))
+            # Более ранняя отметка не уводит запас в минус и не откатывает пополнение.
+            self.assertFalse(callbacks._consume_global_rate_slot(90.0))
+            self.assertGreaterEqual(state.global_rate_tokens, 0.0)
+            self.assertEqual(state.global_rate_last_refill, 100.0)
+            self.assertTrue(callbacks._consume_global_rate_slot(105.0))
+            self.assertFalse(callbacks._consume_global_rate_slot(105.0))
+
+
+class StatusEditTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        state.status_texts.clear()
+        self.addCleanup(state.status_texts.clear)
+
+    async def test_identical_status_text_is_not_resent(self) -> None:
+        status = DummyStatusMessage()
+        status.chat = types.SimpleNamespace(id=100)
+        status.message_id = 7
+        status.text = "⏳"
+
+        await callbacks._safe_status_edit(status, "⏳")
+        await callbacks._safe_status_edit(status, "⬇️")
+        await callbacks._safe_status_edit(status, "⬇️")
+        await callbacks._safe_status_edit(status, "⬇️", reply_markup=object())
+
+        self.assertEqual(status.edits, ["⬇️", "⬇️"])
+
+
+class UploadSlotTests(unittest.IsolatedAsyncioTestCase):
+    async def test_flood_wait_is_retried_once_after_pause(self) -> None:
+        send = mock.AsyncMock(
+            side_effect=[
+                TelegramRetryAfter(method=mock.Mock(), message="flood", retry_after=3),
+                "sent",
+            ]
+        )
+        with mock.patch.object(runtime.asyncio, "sleep", mock.AsyncMock()) as sleep:
+            result = await runtime.send_with_upload_slot(send, chat_id=1, video="file")
+
+        self.assertEqual(result, "sent")
+        sleep.assert_awaited_once_with(3)
+        self.assertEqual(send.await_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
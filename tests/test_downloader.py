@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import tempfile
 import types
 import unittest
@@ -113,6 +114,34 @@ class DownloaderTests(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(fallback_file.exists())
         self.assertEqual(result_path, fallback_file)
 
+    async def test_concurrent_requests_for_same_url_share_one_download(self) -> None:
+        calls = []
+        release = asyncio.Event()
+
+        async def fake_download_once(url, output_dir, timeout, cookies_file, **_kwargs):
+            calls.append(output_dir)
+            await release.wait()
+            target = output_dir / "shared.mp4"
+            target.write_bytes(b"video")
+            return target
+
+        first_dir = self.output_dir / "first"
+        second_dir = self.output_dir / "second"
+        with mock.patch("utils.downloader._download_once", fake_download_once), mock.patch.object(
+            downloader, "video_cache", None
+        ):
+            first = asyncio.create_task(downloader.download_video("https://example.com/v", first_dir))
+            second = asyncio.create_task(downloader.download_video("https://example.com/v", second_dir))
+            await asyncio.sleep(0)
+            release.set()
+            first_path, second_path = await asyncio.gather(first, second)
+
+        self.assertEqual(calls, [first_dir])
+        self.assertEqual(first_path, first_dir / "shared.mp4")
+        self.assertEqual(second_path, second_dir / "shared.mp4")
+        self.assertEqual(second_path.read_bytes(), b"video")
+        self.assertFalse(downloader._inflight)
+
 
 if __name__ == "__main__":
     unittest.main()
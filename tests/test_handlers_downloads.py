@@ -6,7 +6,7 @@ import time
 import logging
 from pathlib import Path
 from types import SimpleNamespace
-from unittest import IsolatedAsyncioTestCase, mock
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
 
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup
@@ -55,10 +55,11 @@ class DownloadsHandlerTests(IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.tmpdir = tempfile.TemporaryDirectory()
         state.user_active_downloads.clear()
+        state.active_user_ids.clear()
         state.user_last_request_ts.clear()
         state.pending_downloads.clear()
         state.chat_last_callback_ts.clear()
-        state.global_callback_events.clear()
+        state.global_rate_last_refill = 0.0
         self._history_patch = mock.patch.object(downloads.config, "ENABLE_HISTORY", False)
         self._history_patch.start()
         self._runtime_log_level = runtime_logger.level
@@ -103,7 +104,7 @@ class DownloadsHandlerTests(IsolatedAsyncioTestCase):
 
         self.assertEqual(len(state.pending_downloads), 1)
         payload = next(iter(state.pending_downloads.values()))
-        self.assertEqual(payload["url"], message.text)
+        self.assertEqual(payload.url, message.text)
         self.assertTrue(message.replies)
         markup = message.replies[0]["kwargs"].get("reply_markup")
         self.assertIsInstance(markup, InlineKeyboardMarkup)
@@ -116,7 +117,7 @@ class DownloadsHandlerTests(IsolatedAsyncioTestCase):
             mock.patch.object(downloads, "is_user_allowed", new=mock.AsyncMock(return_value=True)),
             mock.patch.object(downloads, "ensure_safe_public_url", return_value=None),
             mock.patch.object(downloads, "download_video", new=mock.AsyncMock()) as download_mock,
-            mock.patch.object(downloads.config, "MAX_CONCURRENT_PER_USER", 1),
+            mock.patch.object(downloads, "_MAX_CONCURRENT_PER_USER", 1),
             mock.patch.object(downloads.config, "ENABLE_HISTORY", False),
         ):
             await downloads._process_download_flow(
@@ -232,6 +233,20 @@ class DownloadsHandlerTests(IsolatedAsyncioTestCase):
         self.assertEqual(doc_caption, expected_doc_caption)
 
 
+class UrlPrefilterTests(TestCase):
+    def _message(self, text: str, entities=None) -> SimpleNamespace:
+        return SimpleNamespace(text=text, caption=None, entities=entities, caption_entities=None)
+
+    def test_prefilter_skips_plain_chat_and_commands(self) -> None:
+        self.assertFalse(downloads._might_contain_url(self._message("всем привет")))
+        self.assertFalse(downloads._might_contain_url(self._message("/start https://youtu.be/x")))
+
+    def test_prefilter_accepts_url_entities_and_raw_links(self) -> None:
+        entity = SimpleNamespace(type="url", offset=0, length=9)
+        self.assertTrue(downloads._might_contain_url(self._message("youtu.be/x", [entity])))
+        self.assertTrue(downloads._might_contain_url(self._message("see https://youtu.be/x")))
+
+
 if __name__ == "__main__":
     import unittest
 
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bot_app import maintenance, state
+
+
+class HistoryWriterTests(unittest.TestCase):
+    def test_writer_batches_queued_records(self):
+        async def scenario():
+            queue: asyncio.Queue = asyncio.Queue()
+            for idx in range(3):
+                queue.put_nowait({"user_id": idx, "platform": "youtube", "chat_id": -1})
+            queue.put_nowait(None)
+            await maintenance._history_writer_loop(queue)
+
+        with (
+            mock.patch.object(maintenance, "add_downloads", return_value=True) as add,
+            mock.patch.object(maintenance.stats_service, "invalidate_stats_cache") as invalidate,
+        ):
+            asyncio.run(scenario())
+
+        add.assert_called_once()
+        self.assertEqual([row["user_id"] for row in add.call_args.args[0]], [0, 1, 2])
+        invalidate.assert_called_once_with(-1)
+
+    def test_record_download_writes_directly_without_writer(self):
+        row = {"user_id": 1, "platform": "tiktok", "url": "u", "chat_id": 5}
+        with (
+            mock.patch.object(maintenance, "_history_queue", None),
+            mock.patch.object(maintenance, "add_downloads", return_value=True) as add,
+            mock.patch.object(maintenance.stats_service, "invalidate_stats_cache") as invalidate,
+        ):
+            maintenance.record_download(**row)
+
+        add.assert_called_once_with([row])
+        invalidate.assert_called_once_with(5)
+
+
+class PendingTokenTests(unittest.TestCase):
+    def setUp(self):
+        state.pending_downloads.clear()
+        self.addCleanup(state.pending_downloads.clear)
+
+    def test_oldest_tokens_are_evicted_over_limit(self):
+        with mock.patch.object(state, "PENDING_TOKENS_LIMIT", 2):
+            for idx in range(3):
+                state.add_pending_download(f"tok-{idx}", state.PendingDownload(ts=idx, url="u"))
+
+        self.assertEqual(list(state.pending_downloads), ["tok-1", "tok-2"])
+
+    def test_purge_drops_only_expired_prefix(self):
+        now = 10_000.0
+        ttl = state.PENDING_TOKEN_TTL
+        state.add_pending_download("old", state.PendingDownload(ts=now - ttl - 5, url="u"))
+        state.add_pending_download("fresh", state.PendingDownload(ts=now - 1, url="u"))
+
+        self.assertEqual(maintenance._purge_pending(now), 1)
+        self.assertEqual(list(state.pending_downloads), ["fresh"])
+
+
+class UserStatePurgeTests(unittest.TestCase):
+    def setUp(self):
+        stores = (state.user_active_downloads, state.user_last_request_ts, state.active_user_ids)
+        for store in stores:
+            store.clear()
+            self.addCleanup(store.clear)
+
+    def test_single_pass_resets_stuck_and_drops_idle_users(self):
+        now = 10_000.0
+        state.user_active_downloads.update({1: 1, 2: 0, 3: 1})
+        state.active_user_ids.update({1, 3})
+        state.user_last_request_ts.update({1: now - 500, 2: now - 500, 3: now - 5, 4: now - 500})
+
+        cleared = maintenance._purge_user_state(now, stuck_timeout=100, last_ttl=300)
+
+        # 1 застрял — счётчик сброшен, 2 простаивает — удалён; 3 активен и свеж.
+        self.assertEqual(cleared, (2, 3))
+        self.assertEqual(state.user_active_downloads, {1: 0, 3: 1})
+        self.assertEqual(state.active_user_ids, {3})
+        self.assertEqual(state.user_last_request_ts, {3: now - 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
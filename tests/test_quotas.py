@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+
+from services import quotas
+
+
+class EnforcementPlanCacheTests(unittest.TestCase):
+    def setUp(self):
+        quotas.invalidate_enforcement_plan()
+        self.addCleanup(quotas.invalidate_enforcement_plan)
+
+    def test_plan_is_reused_within_ttl_and_dropped_on_invalidate(self):
+        plans = [{"blocked": False}, {"blocked": True}]
+        with mock.patch.object(quotas, "build_enforcement_plan", side_effect=plans) as build:
+            self.assertFalse(quotas.cached_enforcement_plan(7)["blocked"])
+            self.assertFalse(quotas.cached_enforcement_plan(7)["blocked"])
+            quotas.invalidate_enforcement_plan(7)
+            self.assertTrue(quotas.cached_enforcement_plan(7)["blocked"])
+
+        self.assertEqual(build.call_count, 2)
+
+    def test_expired_plan_is_rebuilt(self):
+        with (
+            mock.patch.object(quotas, "build_enforcement_plan", return_value={}) as build,
+            mock.patch.object(quotas, "ENFORCEMENT_PLAN_TTL_SECONDS", 0),
+        ):
+            quotas.cached_enforcement_plan(7)
+            quotas.cached_enforcement_plan(7)
+
+        self.assertEqual(build.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
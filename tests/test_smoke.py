@@ -64,6 +64,7 @@ class SmokeFlowTests(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self) -> None:
         state.pending_downloads.clear()
         state.user_active_downloads.clear()
+        state.active_user_ids.clear()
         state.user_last_request_ts.clear()
         self.tempdir = tempfile.TemporaryDirectory()
         self.temp_path = Path(self.tempdir.name)
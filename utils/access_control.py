@@ -6,7 +6,8 @@
 - Комбинированный режим
 """
 import logging
-from typing import Optional
+import time
+from typing import Dict, Optional, Tuple
 
 from aiogram import types
 
@@ -14,6 +15,14 @@ import config
 
 logger = logging.getLogger(__name__)
 
+# Подтверждённые админы группы: (chat_id, user_id) -> время проверки.
+# get_chat_member — запрос к Telegram, а права меняются редко. Отказы не кешируются,
+# чтобы новый админ получил доступ сразу; снятие прав сбрасывает кеш через
+# invalidate_admin_status() из обработчиков chat_member/my_chat_member.
+ADMIN_STATUS_TTL_SECONDS = 60.0
+_ADMIN_STATUS_CACHE_MAX = 4096
+_admin_status_cache: Dict[Tuple[int, int], float] = {}
+
 
 async def is_user_allowed(message: types.Message) -> bool:
     """Проверить, разрешена ли загрузка данному пользователю.
@@ -64,13 +73,34 @@ async def _is_admin(message: types.Message) -> bool:
         return False
     
     # Для групп/каналов проверяем права администратора
+    key = (message.chat.id, user_id)
+    now = time.monotonic()
+    checked_at = _admin_status_cache.get(key)
+    if checked_at is not None and now - checked_at < ADMIN_STATUS_TTL_SECONDS:
+        return True
     try:
         member = await message.bot.get_chat_member(message.chat.id, user_id)
-        # Проверяем, является ли пользователь администратором
-        return member.status in ("administrator", "creator")
     except Exception as e:
         logger.warning("Ошибка при проверке прав администратора: %s", e)
         return False
+    # Проверяем, является ли пользователь администратором
+    is_admin = member.status in ("administrator", "creator")
+    if not is_admin:
+        _admin_status_cache.pop(key, None)
+        return False
+    if len(_admin_status_cache) >= _ADMIN_STATUS_CACHE_MAX:
+        _admin_status_cache.clear()
+    _admin_status_cache[key] = now
+    return True
+
+
+def invalidate_admin_status(chat_id: Optional[int] = None) -> None:
+    """Сбросить кеш прав администратора для чата (или целиком)."""
+    if chat_id is None:
+        _admin_status_cache.clear()
+        return
+    for key in [key for key in _admin_status_cache if key[0] == chat_id]:
+        _admin_status_cache.pop(key, None)
 
 
 def get_access_denied_message() -> str:
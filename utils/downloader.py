@@ -11,10 +11,11 @@ import asyncio
 import shlex
 import os
 import re
+import shutil
 from dataclasses import dataclass
 from pathlib import Path
 import logging
-from typing import Awaitable, Callable, Optional
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from uuid import uuid4
 
 import config
@@ -48,6 +49,11 @@ _TOTAL_RE = re.compile(r"of\s+(?:~)?([\d\.]+)([KMGTP]?iB)", re.IGNORECASE)
 _SPEED_RE = re.compile(r"at\s+([\d\.]+)([KMGTP]?iB/s)", re.IGNORECASE)
 _ETA_RE = re.compile(r"ETA\s+([0-9:]+)")
 
+# Загрузки, идущие прямо сейчас: повторный запрос той же ссылки ждёт первую,
+# а не запускает yt-dlp ещё раз. Результат — путь к файлу или None при ошибке.
+_InflightKey = Tuple[str, Optional[str], bool, bool]
+_inflight: Dict[_InflightKey, "asyncio.Future[Optional[Path]]"] = {}
+
 
 def _convert_unit(value: str, unit: str) -> Optional[float]:
     try:
@@ -264,6 +270,53 @@ async def download_video(
     cached_path = await _try_cache_get(url, output_dir)
     if cached_path:
         return cached_path
+
+    key: _InflightKey = (url, format_spec, expect_audio, expect_video)
+    leader = _inflight.get(key)
+    if leader is not None:
+        # shield: отмена этого запроса не должна отменять чужую загрузку.
+        source = await asyncio.shield(leader)
+        if source is not None:
+            shared = await asyncio.to_thread(_link_into, source, output_dir)
+            if shared:
+                logger.info("Reused in-flight download for %s (%s)", url, shared)
+                return shared
+        # Первая загрузка не удалась — пробуем сами.
+
+    future: "asyncio.Future[Optional[Path]]" = asyncio.get_running_loop().create_future()
+    registered = key not in _inflight
+    if registered:
+        _inflight[key] = future
+    result: Optional[Path] = None
+    try:
+        result = await _download_with_retries(
+            url,
+            output_dir,
+            timeout,
+            cookies_file,
+            progress_cb=progress_cb,
+            format_spec=format_spec,
+            expect_audio=expect_audio,
+            expect_video=expect_video,
+        )
+        return result
+    finally:
+        if registered:
+            _inflight.pop(key, None)
+        future.set_result(result)
+
+
+async def _download_with_retries(
+    url: str,
+    output_dir: Path,
+    timeout: int,
+    cookies_file: Optional[str],
+    *,
+    progress_cb: Optional[ProgressCallback],
+    format_spec: Optional[str],
+    expect_audio: bool,
+    expect_video: bool,
+) -> Path:
     attempts = 2
     last_error: Optional[DownloadError] = None
     for attempt in range(attempts):
@@ -555,6 +608,20 @@ async def _try_refresh_instagram(url: str, error_text: str, attempt: int) -> boo
     return False
 
 
+def _link_into(source: Path, output_dir: Path) -> Optional[Path]:
+    """Hard-link (or copy) a finished download into another request's directory."""
+    dest = output_dir / source.name
+    try:
+        os.link(source, dest)
+    except OSError:
+        try:
+            shutil.copy2(source, dest)
+        except OSError:
+            logger.debug("Failed to reuse in-flight download %s", source, exc_info=True)
+            return None
+    return dest
+
+
 async def _try_cache_get(url: str, output_dir: Path) -> Optional[Path]:
     if not video_cache or not video_cache.is_enabled():
         return None